@@ -1,9 +1,12 @@
 import logging
+import hashlib
+import threading
 import jwt
 
 # Package imports
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Optional, Tuple
+from cachetools import TTLCache
 from fastapi import HTTPException
 from fastapi.security import OAuth2PasswordBearer
 
@@ -15,6 +18,9 @@ from schemas.token_schema import TokenData
 """
 This module defines the authentication logic for the application.
 It includes functions for creating access tokens and verifying them, as well as defining the OAuth2 scheme for authentication.
+
+The verified tokens are kept in a short-lived cache, so a token used on many requests is only decoded once per TTL.
+The signing key is parsed once at import, so neither the token creation nor the verification parse it again.
 """
 
 
@@ -24,9 +30,59 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Retrieve environment variables in a Pydantic way
 settings = get_settings()
 
+# The signing key and algorithm of the tokens, read once instead of on every token creation and verification
+secret_key = settings.secret_key
+algorithm = settings.algorithm
+
+# The default lifetime of the access tokens
+default_access_token_expires = timedelta(minutes=int(settings.access_token_expire_minutes))
+
 # OAuth2 flow for authentication using a bearer token obtained with a password
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# The verified tokens (keyed by their digest), mapped to their data and expiration timestamp; the lock guards it across the threadpool
+verified_tokens_cache = TTLCache(maxsize=int(settings.token_cache_size), ttl=int(settings.token_cache_ttl))
+verified_tokens_lock = threading.Lock()
+
+
+def get_token_cache_key(token: str) -> bytes:
+    """
+    Computes the key of a token in the verified tokens cache, a short digest instead of the whole encoded token.
+
+    :param token: The encoded token.
+    :return: The 16 bytes BLAKE2b digest of the token.
+    """
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+def prepare_token_keys(secret_key: str, algorithm: str) -> Tuple[Any, Any]:
+    """
+    Parses the signing key into the key objects of the algorithm, once instead of on every token creation and verification.
+    The asymmetric algorithms (e.g. RS256) sign with the private key and verify with its public key,
+    while the HMAC ones use the same key bytes for both.
+
+    :param secret_key: The signing key, a secret or a PEM-encoded private key.
+    :param algorithm: The algorithm of the tokens.
+    :return: The signing and verifying keys, or None for both if the key or the algorithm is missing or invalid.
+    """
+    if not secret_key or not algorithm:
+        return None, None
+
+    try:
+        signing_key = jwt.get_algorithm_by_name(algorithm).prepare_key(secret_key)
+
+    except (NotImplementedError, jwt.PyJWTError, ValueError) as key_excep:
+        logging.error(f"Could not prepare the signing key for the {algorithm} algorithm: {key_excep}")
+        return None, None
+
+    verifying_key = signing_key.public_key() if hasattr(signing_key, "public_key") else signing_key
+
+    return signing_key, verifying_key
+
+
+# The parsed keys of the tokens
+signing_key, verifying_key = prepare_token_keys(secret_key, algorithm)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -47,22 +103,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
             expire = datetime.now(timezone.utc) + expires_delta
         else:
             logging.info("Using the default expiration delta from the environment")
-            expire = datetime.now(timezone.utc) + timedelta(minutes=int(settings.access_token_expire_minutes))
+            expire = datetime.now(timezone.utc) + default_access_token_expires
         
         #  Set token expiration
         to_encode.update({"exp": expire})
         
         # Generate JWT token
-        secret_key = settings.secret_key
-        algorithm = settings.algorithm
-
-        if not secret_key or not algorithm:
+        if signing_key is None:
             logging.error("SECRET_KEY or ALGORITHM is not set in the environment")
             raise ValueError("SECRET_KEY or ALGORITHM is not set in the environment")
 
         encoded_jwt = jwt.encode(
             payload=to_encode, 
-            key=secret_key, 
+            key=signing_key, 
             algorithm=algorithm
         )
         
@@ -82,18 +135,29 @@ def verify_access_token(token: str, credentials_exception: HTTPException) -> Tok
     :param credentials_exception: The exception to raise if the token is invalid.
     :return: The token data.
     """
-    try:
-        secret_key = settings.secret_key
-        algorithm = settings.algorithm
+    cache_key = get_token_cache_key(token)
+
+    with verified_tokens_lock:
+        cached_token = verified_tokens_cache.get(cache_key)
+
+    # A cached token is still checked against its own expiration, which may come before the cache TTL
+    if cached_token is not None:
+        token_data, expires_at = cached_token
+
+        if expires_at is None or datetime.now(timezone.utc).timestamp() < expires_at:
+            return token_data
+
+        invalidate_access_token(token)
 
-        if not secret_key or not algorithm:
+    try:
+        if verifying_key is None:
             logging.error("SECRET_KEY or ALGORITHM is not set in the environment")
             raise credentials_exception
 
         # Decode the JWT token
         payload = jwt.decode(
             jwt=token,
-            key=secret_key,
+            key=verifying_key,
             algorithms=[algorithm]
         )
         
@@ -103,21 +167,37 @@ def verify_access_token(token: str, credentials_exception: HTTPException) -> Tok
             logging.warning("Token does not contain a subject ('sub')")
             raise credentials_exception
 
-        return TokenData(username=username)
+        token_data = TokenData(username=username)
+
+        with verified_tokens_lock:
+            verified_tokens_cache[cache_key] = (token_data, payload.get("exp"))
+
+        return token_data
     
     except jwt.ExpiredSignatureError as expired_signature_excep:
         logging.error(f"Token expired error: {expired_signature_excep}")
         raise HTTPException(status_code=401, detail="Token expired")
     
-    except jwt.JWTClaimsError as claims_excep:
+    except (jwt.ImmatureSignatureError, jwt.MissingRequiredClaimError) as claims_excep:
         logging.error(f"Invalid claims in the token: {claims_excep}")
         raise HTTPException(status_code=401, detail="Invalid token claims")
     
-    except jwt.JWTError as jwt_error:
+    except jwt.PyJWTError as jwt_error:
         logging.error(f"JWT error: {jwt_error}")
         raise credentials_exception
 
 
+def invalidate_access_token(token: str) -> None:
+    """
+    Removes a token from the verified tokens cache, so it is decoded again on its next use (e.g. on logout).
+
+    :param token: The token to invalidate.
+    :return: None
+    """
+    with verified_tokens_lock:
+        verified_tokens_cache.pop(get_token_cache_key(token), None)
+
+
 def authenticate_user(username: str, password: str) -> dict:
     """
     Dummy authentication function.
@@ -11,7 +11,8 @@ from .config import get_settings
 """
 This module is defining the Celery service for the application's async task processing.
 It defines the Celery instance and configures the results backend.
-It also autodiscovers the tasks in the database.manage_database module, for async embeddings processing.
+It also autodiscovers the tasks in the database.manage_database module, for async embeddings processing,
+    and in the services.answers_service module, for the answers generated in the background.
 """
 
 
@@ -40,8 +41,8 @@ celery.conf.update(
     broker_connection_retry_on_startup=True
 )
 
-# Autodiscover the database embeddings tasks
-celery.autodiscover_tasks(['database.manage_database'])
+# Autodiscover the database embeddings and the background answers tasks
+celery.autodiscover_tasks(['database.manage_database', 'services.answers_service'])
 
 # Log the Celery initialization
 logging.info(f"Celery application started with broker '{broker_url}'...")
@@ -1,11 +1,13 @@
 # Package imports
 from functools import lru_cache
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 """
 This module defines the environment variables and configuration for the application.
 It uses the Pydantic library to define the settings and the lru_cache decorator to cache the settings object.
+The bounds of the tunables are validated when the settings are loaded, so a bad value fails at startup instead of in a task.
 """
 
 
@@ -17,6 +19,13 @@ class Settings(BaseSettings):
     celery_broker_url: str
     celery_result_backend: str
     
+    # Redis cache settings
+    redis_cache_url: str = "redis://redis:6379/1"
+    embeddings_cache_size: int = 10000
+    query_embeddings_cache_ttl: int = 86400
+    responses_cache_ttl: int = 3600
+    stored_embeddings_cache_ttl: int = 86400
+
     # PostgreSQL settings
     postgres_db: str
     postgres_user: str
@@ -24,6 +33,11 @@ class Settings(BaseSettings):
     postgres_host: str = 'db'
     postgres_port: str = '5432'
 
+    # The database connection pool settings, shared by every session of a process
+    db_pool_size: int = Field(10, gt=0)
+    db_max_overflow: int = Field(20, ge=0)
+    db_pool_timeout: int = Field(30, gt=0)
+
     # The name of the collection in the vector database
     faq_collection_name: str
 
@@ -32,12 +46,45 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 60
     secret_key: str
 
-    # The batch size for the vector database
-    batch_size: int = 30
+    # The verified tokens cache, which skips decoding a token on every request
+    token_cache_ttl: int = 60
+    token_cache_size: int = 10000
+
+    # The batch size for the vector database, capped by the number of inputs of an OpenAI embeddings request
+    batch_size: int = Field(30, gt=0, le=2048)
+
+    # The batching of the routes' embeddings writes, sent as a single task per batch
+    write_queue_batch_size: int = Field(100, gt=0)
+    write_queue_flush_interval_ms: int = Field(500, gt=0)
+
+    # The number of batches whose embeddings are computed concurrently
+    embedding_workers: int = Field(8, gt=0)
+
+    # The maximum number of texts sent in a single OpenAI embeddings request, which accepts up to 2048
+    embeddings_request_size: int = Field(1000, gt=0, le=2048)
+
+    # The micro-batching of the questions' embeddings, gathered within a window into a single OpenAI request
+    query_embeddings_batch_size: int = Field(64, gt=0, le=2048)
+    query_embeddings_batch_window_ms: int = Field(10, gt=0)
 
     # The similarity between local and prompt embeddings
     similarity_threshold: float = 0.85
 
+    # The size of the HNSW index's candidates list used by the similarity search
+    hnsw_ef_search: int = 40
+
+    # The number of half precision candidates reranked with the full precision embeddings (at most the HNSW candidates list size)
+    search_rerank_candidates: int = Field(20, gt=0)
+
+    # Search a cached matrix of the collection in memory instead of the HNSW index (for small collections)
+    similarity_search_in_memory: bool = False
+
+    # Start the OpenAI fallback alongside the similarity search, cancelling it on a match (costs a request per question)
+    speculative_openai_responses: bool = False
+
+    # Render the static pages again when their template changes (for development, costs a stat per page request)
+    reload_templates: bool = False
+
     # OpenAI model settings
     openai_api_key: str
     openai_model_name: str = "gpt-3.5-turbo"
@@ -45,6 +92,9 @@ class Settings(BaseSettings):
     openai_model_n: int = 1
     openai_model_temperature: float = 0.3
 
+    # The maximum number of chains run concurrently when responding to several prompts at once
+    openai_max_concurrency: int = Field(8, gt=0)
+
     model_config = SettingsConfigDict(env_file=".env")
 
     @property
@@ -54,6 +104,13 @@ class Settings(BaseSettings):
             f"{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         )
 
+    @property
+    def async_database_url(self) -> str:
+        return (
+            f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}@"
+            f"{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
+        )
+
 
 @lru_cache()
 def get_settings() -> Settings:
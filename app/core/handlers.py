@@ -3,6 +3,7 @@ import logging
 # Package imports
 from fastapi import Request, status
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
 
 # Local files imports
 from schemas.error_schema import ValidationErrorDetail, ValidationErrorResponse
@@ -25,17 +26,24 @@ async def validation_exception_handler(request: Request, exception: RequestValid
 
     :param request: The request object.
     :param exception: The validation exception.
-    :return: A validation error response.
+    :return: A validation error response, serialized with orjson.
     """
     logging.error(f"Validation error: {exception}")
     
-    return ValidationErrorResponse(
+    validation_error_response = ValidationErrorResponse(
         code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         detail=[
             ValidationErrorDetail(
-                location=error.get("loc"),
+                # The location holds the indexes of list items as integers
+                location=[str(location) for location in error.get("loc", ())],
                 message=error.get("msg"),
                 type=error.get("type")
             ) for error in exception.errors()
         ]
     )
+
+    # Exception handlers must return a response, the model isn't serialized by FastAPI here
+    return ORJSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content=validation_error_response.model_dump()
+    )
@@ -6,14 +6,23 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 # Local files imports
-from database.create_database import create_database_if_not_exists, setup_database
-from utils.utils import store_initial_embeddings
+from database.base import async_engine
+from database.create_database import create_database_if_not_exists, setup_database, create_vector_index
+from utils.utils import get_openai_responder, store_initial_embeddings
+from utils.faq_utils import retrieve_locally_stored_FAQ
+from core.templates import STATIC_PAGES, render_static_page
+from services.task_queue_service import add_embeddings_queue
+from services.embeddings_batcher_service import query_embeddings_batcher
 
 
 """
 This module defines the lifespan context manager for the FastAPI application.
 
-lifespan: Sets up the database and initial embeddings when the application starts up.
+prepare_database: Creates the database if needed, then sets up its tables and indexes.
+
+lifespan: Sets up the database and initial embeddings when the application starts up,
+          pre-renders the static HTML pages, builds the OpenAI responder and runs the embeddings write queue and the questions' embeddings batcher
+          until it shuts down.
 """
 
 
@@ -21,6 +30,20 @@ lifespan: Sets up the database and initial embeddings when the application start
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+async def prepare_database(loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Creates the database if it doesn't exist, then sets up its extension, tables and indexes, in the default executor.
+
+    :param loop: The running event loop.
+    :return: None
+    """
+    await loop.run_in_executor(None, create_database_if_not_exists)
+    logging.info("Database creation check completed.")
+
+    await loop.run_in_executor(None, setup_database)
+    logging.info("Database setup completed successfully!")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -32,17 +55,42 @@ async def lifespan(app: FastAPI):
     loop = asyncio.get_running_loop()
     
     try:
-        await loop.run_in_executor(None, create_database_if_not_exists)
-        logging.info("Database creation check completed.")
-        
-        await loop.run_in_executor(None, setup_database)
-        logging.info("Database setup completed successfully!")
+        # The local FAQ is loaded while the database is prepared, the embeddings are only stored once both are done
+        faq_local_database, _ = await asyncio.gather(
+            loop.run_in_executor(None, retrieve_locally_stored_FAQ),
+            prepare_database(loop)
+        )
 
-        await loop.run_in_executor(None, store_initial_embeddings)
+        await loop.run_in_executor(None, store_initial_embeddings, faq_local_database)
         logging.info('Stored initial FAQ embeddings in the database.')
+
+        # Build the HNSW index over the loaded embeddings, instead of growing it through every initial insert
+        await loop.run_in_executor(None, create_vector_index)
+
+        # Render the static pages once, so the routes only return the cached bytes
+        for page_name in STATIC_PAGES:
+            render_static_page(page_name)
+        logging.info('Pre-rendered the static HTML pages.')
+
+        # Build the cached responder, so the first question doesn't pay for its chains and clients
+        get_openai_responder()
     
     except Exception as setup_excep:
         logging.error(f"Error during database setup: {setup_excep}")
         raise
-    
-    yield
+
+    # Batch the embeddings writes of the routes while the app runs, sending the queued ones on shutdown
+    await add_embeddings_queue.start()
+
+    # Embed the questions asked concurrently with a single request, embedding the queued ones on shutdown
+    await query_embeddings_batcher.start()
+
+    try:
+        yield
+
+    finally:
+        await query_embeddings_batcher.stop()
+        await add_embeddings_queue.stop()
+
+        # Close the asyncio engine's pooled connections
+        await async_engine.dispose()
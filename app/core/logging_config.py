@@ -0,0 +1,73 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Package imports
+from typing import Optional
+
+
+"""
+This module configures the application's logging, so the log records are written by a background thread.
+
+setup_queued_logging: Replaces the root logger's handlers with a queue handler, whose records are written to stderr
+    by a listener thread. Logging from the routes then only enqueues the record, instead of blocking the event loop
+    on the write when stderr is piped to a slow log collector.
+
+stop_queued_logging: Stops the listener thread, once it has written the records still queued. It runs at exit.
+"""
+
+
+# The format of the log records, shared by the whole application
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# The listener writing the queued log records, set once the logging is configured
+log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_queued_logging(level: int = logging.INFO) -> None:
+    """
+    Configures the root logger to enqueue its records, and starts the listener thread writing them to stderr.
+    The handlers added before (e.g. by the modules' basicConfig calls) are replaced.
+
+    :param level: The level of the root logger.
+    :return: None
+    """
+    global log_listener
+
+    if log_listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root_logger = logging.getLogger()
+
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+    log_listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    log_listener.start()
+
+    atexit.register(stop_queued_logging)
+
+
+def stop_queued_logging() -> None:
+    """
+    Stops the listener thread, once it has written the records still queued.
+
+    :return: None
+    """
+    global log_listener
+
+    if log_listener is None:
+        return
+
+    log_listener.stop()
+    log_listener = None
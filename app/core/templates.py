@@ -1,17 +1,61 @@
 # Package imports
 from fastapi.templating import Jinja2Templates
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
+
+# Local files imports
+from core.config import get_settings
 
 
 """
 This module sets up the templates directory for rendering HTML templates in the FastAPI application.
 
 templates: Configures the Jinja2 template renderer for rendering HTML templates.
+
+render_static_page: Renders a template without per-request context once, caching the resulting bytes
+    (until the template file is modified, when the templates are reloaded).
 """
 
 
+# Retrieve the environment variables as settings
+settings = get_settings()
+
+
 # Set the base path
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Set the templates directory for rendering HTML templates
 templates = Jinja2Templates(directory=str(Path(BASE_DIR, 'templates')))
+
+# The pages which don't depend on the request, rendered once at startup
+STATIC_PAGES = ("login.html", "question.html")
+
+# Whether the static pages are rendered again when their template file is modified, instead of once (for development)
+reload_templates = settings.reload_templates
+
+
+@lru_cache(maxsize=len(STATIC_PAGES))
+def render_static_page_version(template_name: str, modified_time: Optional[float]) -> bytes:
+    """
+    Renders a template which doesn't depend on the request, caching the encoded HTML per template file version.
+
+    :param template_name: The name of the template to render.
+    :param modified_time: The modification time of the template file, which keys the cached version,
+        or None when the templates aren't reloaded.
+    :return: The rendered HTML, encoded as UTF-8 bytes.
+    """
+    return templates.get_template(template_name).render().encode("utf-8")
+
+
+def render_static_page(template_name: str) -> bytes:
+    """
+    Returns the rendered HTML of a template which doesn't depend on the request.
+    Unless the templates are reloaded, it is rendered once, without checking the template file on every request.
+
+    :param template_name: The name of the template to render.
+    :return: The rendered HTML, encoded as UTF-8 bytes.
+    """
+    modified_time = Path(BASE_DIR, 'templates', template_name).stat().st_mtime if reload_templates else None
+
+    return render_static_page_version(template_name, modified_time)
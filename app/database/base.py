@@ -1,8 +1,12 @@
 import logging
 
 # Package imports
-from contextlib import contextmanager
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager, contextmanager
+from pgvector.asyncpg import register_vector as register_async_vector
+from pgvector.psycopg2 import register_vector
+from psycopg2 import ProgrammingError
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
@@ -10,7 +14,7 @@ from threading import local
 
 # Local files imports
 from core.config import get_settings
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 
 """
@@ -19,6 +23,9 @@ It also creates the database tables based on the defined models.
 
 It defines the 'get_db_session' method for returning a database session, which is used in the routes.
 The session is managed using a context manager to ensure proper commit and rollback operations.
+
+It also defines an asyncio engine (using asyncpg) and the 'get_async_db_session' method, used by the routes' queries
+which are awaited instead of blocking a thread of the threadpool.
 """
 
 
@@ -32,14 +39,70 @@ settings = get_settings()
 engine = create_engine(
     settings.database_url,
     poolclass=QueuePool,  # Use a queue pool for connection reusage
-    pool_size=10, # at most 10 connection in the pool
-    max_overflow=20,
+    pool_size=int(settings.db_pool_size), # persistent connections kept in the pool
+    max_overflow=int(settings.db_max_overflow), # extra connections opened under load
+    pool_pre_ping=True, # replace connections dropped by the server instead of failing the request
+    pool_timeout=int(settings.db_pool_timeout), # seconds to wait for a connection once the pool is exhausted
     isolation_level="READ_COMMITTED" # important for managing how concurrent transactions interact with each other
 )
 
+# Create an asyncio database engine with its own connection pool, for the queries awaited by the routes
+# asyncpg prepares and caches the statements of every connection, so the repeated queries are only planned once
+async_engine = create_async_engine(
+    settings.async_database_url,
+    pool_size=int(settings.db_pool_size),
+    max_overflow=int(settings.db_max_overflow),
+    pool_pre_ping=True,
+    pool_timeout=int(settings.db_pool_timeout),
+    isolation_level="READ_COMMITTED"
+)
+
+
+@event.listens_for(engine, "connect")
+def register_vector_adapter(dbapi_connection, connection_record) -> None:
+    """
+    Registers pgvector's psycopg2 adapter on every new pooled connection.
+    This way, vectors are bound from NumPy arrays and fetched as NumPy arrays, without any manual conversion.
+
+    :param dbapi_connection: The raw psycopg2 connection.
+    :param connection_record: The pool's record of the connection.
+    :return: None
+    """
+    try:
+        register_vector(dbapi_connection)
+
+    except ProgrammingError as register_excep:
+        # The vector extension is only created during the database setup, which disposes the pool afterwards
+        logging.warning(f"Could not register the pgvector adapter: {register_excep}")
+
+        # Leave the connection usable, since the failed type lookup aborted its transaction
+        dbapi_connection.rollback()
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def register_async_vector_adapter(dbapi_connection, connection_record) -> None:
+    """
+    Registers pgvector's asyncpg codec on every new pooled asyncio connection.
+    This way, vectors are bound from NumPy arrays and fetched as NumPy arrays, without any manual conversion.
+
+    :param dbapi_connection: The asyncpg connection, wrapped by SQLAlchemy.
+    :param connection_record: The pool's record of the connection.
+    :return: None
+    """
+    try:
+        dbapi_connection.run_async(register_async_vector)
+
+    except Exception as register_excep:
+        # The vector extension is only created during the database setup
+        logging.warning(f"Could not register the pgvector codec: {register_excep}")
+
+
 # Create a session for database transactions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create an asyncio session for the awaited database transactions
+AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Define a declarative base for the database table
 Base = declarative_base()
 
@@ -98,3 +161,26 @@ def get_db_session() -> Generator[Session, None, None]:
 
         # Delete the session from the thread
         del thread_local.session
+
+
+@asynccontextmanager
+async def get_async_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provides an asyncio database session, committed when the block succeeds and rolled back otherwise.
+    Unlike the sessions of get_db_session, it isn't shared per thread, since all the requests run on the event loop's thread.
+
+    :return: An asyncio database session object.
+    """
+    async with AsyncSessionLocal() as db_session:
+        try:
+            yield db_session
+
+            logging.info("Committing async database operation")
+            await db_session.commit()
+
+        except Exception as session_excep:
+            await db_session.rollback()
+
+            logging.error(f"Error occurred in async database session: {session_excep}")
+
+            raise session_excep
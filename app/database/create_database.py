@@ -7,6 +7,8 @@ from sqlalchemy.exc import OperationalError, DatabaseError, ProgrammingError, SQ
 
 # Local files imports
 from core.config import get_settings
+from .base import engine as session_engine
+from .models import Embedding
 
 
 """
@@ -15,6 +17,9 @@ This module sets up the database and tables for the contextual FAQ assistant.
 It first creates the database if it doesn't exist, then sets up the necessary tables.
 
 It also includes a retry mechanism for table creation in case of errors.
+
+The HNSW vector index is created separately, once the initial embeddings are loaded, since building it over the
+loaded rows is much faster than maintaining it through every insert.
 """
 
 
@@ -24,6 +29,65 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Retrieve the environment variables as settings
 settings = get_settings()
 
+# The dimension of the stored embeddings, taken from the embeddings table model, which sizes the vector columns and casts
+EMBEDDING_DIMENSION = Embedding.__table__.c.embedding.type.dim
+
+# The similarity search, run by the questions' route in a single round trip
+# It returns the embedding most similar to the query within a collection, and, if it is at least as similar as the
+# threshold, records its use in the same statement. A row already locked by a concurrent match is skipped,
+# so the hits on a popular question don't wait on each other.
+# The HNSW index (on the half precision embeddings) finds the candidates, which are reranked with the full precision ones.
+# Its query is planned for every call's collection, so the FAQ collection's searches can use its partial index.
+FAQ_LOOKUP_FUNCTION = """
+    CREATE OR REPLACE FUNCTION faq_lookup(query_embedding vector, collection_name text, threshold float8)
+    RETURNS TABLE (content text, embedding vector, answer text, similarity float8)
+    LANGUAGE plpgsql
+    SET hnsw.ef_search = {hnsw_ef_search}
+    SET plan_cache_mode = force_custom_plan
+    AS $$
+    #variable_conflict use_column
+    BEGIN
+        RETURN QUERY
+        WITH best AS (
+            SELECT candidates.id, candidates.content, candidates.embedding, candidates.answer,
+                (candidates.embedding <#> query_embedding) * -1 AS similarity
+            FROM (
+                SELECT id, content, embedding, answer
+                FROM embeddings
+                WHERE collection = collection_name
+                ORDER BY embedding::halfvec({embedding_dimension}) <#> query_embedding::halfvec({embedding_dimension})
+                LIMIT {search_rerank_candidates}
+            ) candidates
+            ORDER BY candidates.embedding <#> query_embedding
+            LIMIT 1
+        ), used AS (
+            UPDATE embeddings SET last_used = now()
+            WHERE id = (
+                SELECT locked.id
+                FROM embeddings locked
+                JOIN best ON locked.id = best.id
+                WHERE best.similarity >= threshold
+                FOR UPDATE OF locked SKIP LOCKED
+            )
+        )
+        SELECT best.content, best.embedding, best.answer, best.similarity FROM best;
+    END;
+    $$;
+"""
+
+# The HNSW indexes serving the similarity search: one over every collection, and a partial one over the FAQ collection
+VECTOR_INDEXES = {
+    "embeddings_vector_halfvec_hnsw_idx": f"""
+        CREATE INDEX IF NOT EXISTS embeddings_vector_halfvec_hnsw_idx ON embeddings
+            USING hnsw ((embedding::halfvec({EMBEDDING_DIMENSION})) halfvec_ip_ops) WITH (m = 16, ef_construction = 64);
+    """,
+    "embeddings_faq_vector_halfvec_hnsw_idx": f"""
+        CREATE INDEX IF NOT EXISTS embeddings_faq_vector_halfvec_hnsw_idx ON embeddings
+            USING hnsw ((embedding::halfvec({EMBEDDING_DIMENSION})) halfvec_ip_ops) WITH (m = 16, ef_construction = 64)
+            WHERE collection = :collection;
+    """
+}
+
 
 class DatabaseCreationError(Exception):
     """
@@ -81,6 +145,9 @@ def create_database_if_not_exists() -> None:
             else:
                 logging.info(f"Database {db_name} already exists!")
 
+        # This engine is only needed once, so release its connection right away
+        init_engine.dispose()
+
     except OperationalError as operational_excep:
         logging.error(f"OperationalError while connecting or creating the database: {operational_excep}")
         raise DatabaseCreationError("Failed to create database due to operational issues") from operational_excep
@@ -97,7 +164,7 @@ def create_database_if_not_exists() -> None:
 def setup_database(max_retries: int = 5, retry_delay: int = 5) -> None:
     """
     Sets up the database by creating the necessary tables if they don't exist.
-    It also tries to create the database altogheter if it doesn't exist.
+    The database itself must already exist, the lifespan creates it with create_database_if_not_exists first.
 
     Keeping collections within the same table as embeddings, by storing the collection name alongside the embedding data. 
     The main downside is potential inefficiency with larger datasets, but for this specific use-case is the easiest choice.
@@ -106,18 +173,13 @@ def setup_database(max_retries: int = 5, retry_delay: int = 5) -> None:
     :param retry_delay: Delay in seconds between retries
     :return: None
     """
-    create_database_if_not_exists()
-
     # Set a retry mechanism for table creation
     retries = 0
 
     while retries < max_retries:
         try:
-            # Create an engine to connect to the database
-            engine = create_engine(settings.database_url)
-
-            # Create the needed table and extension
-            with engine.connect() as conn:
+            # Create the needed table and extension, reusing the application's pooled engine
+            with session_engine.connect() as conn:
 
                 conn = conn.execution_options(isolation_level="AUTOCOMMIT")
 
@@ -136,26 +198,85 @@ def setup_database(max_retries: int = 5, retry_delay: int = 5) -> None:
                     logging.info("Creating embeddings table...")
 
                     # Create the embeddings table
-                    conn.execute(text("""
+                    conn.execute(text(f"""
                         CREATE EXTENSION IF NOT EXISTS vector;
                         
                         CREATE TABLE IF NOT EXISTS embeddings (
                             id SERIAL PRIMARY KEY,
                             content TEXT NOT NULL,
-                            embedding vector(1536),
+                            embedding vector({EMBEDDING_DIMENSION}),
                             answer TEXT NOT NULL,
-                            collection VARCHAR(255) NOT NULL
+                            collection VARCHAR(255) NOT NULL,
+                            content_hash BYTEA GENERATED ALWAYS AS (decode(md5(content), 'hex')) STORED,
+                            last_used TIMESTAMPTZ
                         );
 
                         CREATE INDEX IF NOT EXISTS embeddings_collection_idx ON embeddings(collection);
-                        
-                        CREATE INDEX IF NOT EXISTS embeddings_vector_idx ON embeddings USING ivfflat (embedding vector_cosine_ops);
                     """))
 
                     logging.info("Embeddings table created successfully!")
+
+                    # Drop the pooled connections opened before the vector extension existed,
+                    # so the new ones get pgvector's adapter registered
+                    session_engine.dispose()
                 else:
                     logging.info("Embeddings table already exists!")
 
+                # Ensure a content is stored once per collection, so the embeddings can be upserted
+                # The index is built on a hash of the content, which stays small and fast whatever the content length
+                unique_index_exists = conn.execute(
+                    text("SELECT to_regclass('embeddings_collection_content_hash_key') IS NOT NULL;")
+                ).scalar()
+
+                if not unique_index_exists:
+                    logging.info("Creating the unique (collection, content hash) index...")
+
+                    # Tables created before the constraint existed may hold duplicates, which are removed first
+                    conn.execute(text("""
+                        ALTER TABLE embeddings
+                            ADD COLUMN IF NOT EXISTS content_hash BYTEA GENERATED ALWAYS AS (decode(md5(content), 'hex')) STORED;
+
+                        DELETE FROM embeddings duplicate
+                        USING embeddings original
+                        WHERE duplicate.id > original.id
+                            AND duplicate.content_hash = original.content_hash
+                            AND duplicate.collection = original.collection;
+
+                        CREATE UNIQUE INDEX IF NOT EXISTS embeddings_collection_content_hash_key ON embeddings (collection, content_hash);
+
+                        DROP INDEX IF EXISTS embeddings_content_collection_key;
+                    """))
+
+                # Databases created with an older image lack the halfvec type, so their extension is updated, once
+                halfvec_type_exists = conn.execute(text("SELECT to_regtype('halfvec') IS NOT NULL;")).scalar()
+
+                if not halfvec_type_exists:
+                    logging.info("Updating the vector extension...")
+
+                    conn.execute(text("ALTER EXTENSION vector UPDATE;"))
+
+                # Drop the older IVFFlat and full precision HNSW indexes, the similarity search is served by the
+                # half precision inner product HNSW index created by create_vector_index
+                conn.execute(text("""
+                    DROP INDEX IF EXISTS embeddings_vector_idx;
+
+                    DROP INDEX IF EXISTS embeddings_vector_hnsw_idx;
+
+                    DROP INDEX IF EXISTS embeddings_vector_ip_hnsw_idx;
+                """))
+
+                # Tables created before the similarity search recorded the matches lack their last use column
+                conn.execute(text("""
+                    ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS last_used TIMESTAMPTZ;
+                """))
+
+                # (Re)create the similarity search function, so it follows the current HNSW search and rerank settings
+                conn.execute(text(FAQ_LOOKUP_FUNCTION.format(
+                    embedding_dimension=EMBEDDING_DIMENSION,
+                    hnsw_ef_search=int(settings.hnsw_ef_search),
+                    search_rerank_candidates=int(settings.search_rerank_candidates)
+                )))
+
             logging.info("Database setup completed successfully!")
             return
         
@@ -190,3 +311,49 @@ def setup_database(max_retries: int = 5, retry_delay: int = 5) -> None:
             raise DatabaseSetupError(f"An unexpected error occurred: {unexpected_excep}")
 
     raise Exception(f"Failed to set up the database after {max_retries} attempts.")
+
+
+def create_vector_index() -> None:
+    """
+    Creates the HNSW indexes serving the similarity search, if they don't exist, and refreshes the table's statistics.
+    The stored embeddings are normalized, so the indexes use the inner product instead of the cosine distance.
+    They're built on the embeddings cast to half precision, which halves their size, the search reranks their candidates.
+
+    Besides the index over every collection, a partial index covers the FAQ collection only: HNSW applies the collection
+    filter after walking its graph, so walking a graph of the FAQ embeddings alone keeps all the candidates in the collection.
+    The partial index is bound to the FAQ collection name, so it must be dropped if that name changes.
+
+    It's meant to run after the initial embeddings are bulk loaded: building the graphs over the loaded rows at once
+    is much faster than inserting every row into existing ones.
+
+    :return: None
+    """
+    try:
+        with session_engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+
+            indexes_created = False
+
+            for index_name, create_index_statement in VECTOR_INDEXES.items():
+                index_exists = conn.execute(
+                    text("SELECT to_regclass(:index_name) IS NOT NULL;"),
+                    {"index_name": index_name}
+                ).scalar()
+
+                if index_exists:
+                    logging.info(f"HNSW index '{index_name}' already exists!")
+                    continue
+
+                logging.info(f"Creating the HNSW index '{index_name}' on the embeddings...")
+
+                conn.execute(text(create_index_statement), {"collection": settings.faq_collection_name})
+                indexes_created = True
+
+                logging.info(f"HNSW index '{index_name}' created successfully!")
+
+            if indexes_created:
+                conn.execute(text("ANALYZE embeddings;"))
+
+    except SQLAlchemyError as index_excep:
+        logging.error(f"Error while creating the HNSW indexes: {index_excep}")
+        raise DatabaseSetupError(f"Failed to create the HNSW indexes: {index_excep}") from index_excep
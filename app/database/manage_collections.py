@@ -2,10 +2,11 @@ import logging
 
 # Package imports
 from sqlalchemy.exc import DatabaseError, InterfaceError, IntegrityError
-from typing import List
+from typing import List, Optional
 
 # Local files imports
 from .base import get_db_session
+from .manage_database import invalidate_collection_matrix
 from .models import Embedding, Collection
 
 
@@ -14,11 +15,13 @@ This module provides functions to manage collections in the database.
 
 Functions:
 - get_collection(collection_name: str): Retrieves a collection from the database by its name.
-- get_collections(): Retrieves all collections from the database.
+- get_collections(limit: int, after: Optional[str]): Retrieves a page of collections from the database, ordered by name.
 - add_collection(collection_name: str): Adds a new collection to the database.
 - update_collection(old_collection_name: str, new_collection_name: str): Updates the collection in the database 
     with the new collection name.
 - delete_collection(collection_name: str): Deletes the collection from the database.
+
+The collection names are validated by the collection schema and the routes, before any of them is called.
 """
 
 
@@ -59,18 +62,25 @@ def get_collection_from_db(collection_name: str) -> Collection:
     return
 
 
-def get_collections_from_db(limit: int = 100) -> List[Collection]:
+def get_collections_from_db(limit: int = 100, after: Optional[str] = None) -> List[Collection]:
     """
-    Retrieves all collections from the database.
+    Retrieves a page of collections from the database, ordered by name.
+    The pages are found by keyset: the query seeks past the last name of the previous page on the unique name index,
+        so it scans at most `limit` rows, however deep the page is.
 
     :param limit: The maximum number of collections to retrieve.
+    :param after: Optional, the name of the last collection of the previous page.
     :return: A list of collections if found else None.
     """
     try:
         with get_db_session() as session:
             # Run the SQL query using the local session
-            collections = session.query(Collection.name) \
-                            .distinct() \
+            query = session.query(Collection.name)
+
+            if after is not None:
+                query = query.filter(Collection.name > after)
+
+            collections = query.order_by(Collection.name) \
                             .limit(limit) \
                             .all()
 
@@ -101,10 +111,6 @@ def add_collection_to_db(collection_name: str) -> None:
     :param collection_name: The name of the collection to add.
     :return: None
     """
-    if not collection_name:
-        logging.error("Collection name cannot be empty.")
-        raise ValueError("Collection name cannot be empty.")
-
     try:
         # Run the SQL query using the local session
         with get_db_session() as session:
@@ -149,10 +155,6 @@ def update_collection_in_db(old_collection_name: str, new_collection_name: str)
     :param new_collection_name: The new name of the collection.
     :return: None
     """
-    if not new_collection_name:
-        logging.error("New collection name cannot be empty.")
-        raise ValueError("New collection name cannot be empty.")
-
     try:
         with get_db_session() as session:
             # Check if the old collection exists
@@ -187,7 +189,11 @@ def update_collection_in_db(old_collection_name: str, new_collection_name: str)
     except (DatabaseError, InterfaceError) as database_exception:
         logging.error(f"Error updating collection in database: {database_exception}")
         raise database_exception
-    
+
+    # The embeddings moved to the new collection, so the cached data (matrices, vectors and responses) of both is stale
+    invalidate_collection_matrix(old_collection_name)
+    invalidate_collection_matrix(new_collection_name)
+
     return
 
 
@@ -199,10 +205,6 @@ def delete_collection_from_db(collection_name: str) -> None:
     :param collection_name: The name of the collection to delete.
     :return: None
     """
-    if not collection_name:
-        logging.error("Collection name cannot be empty.")
-        raise ValueError("Collection name cannot be empty.")
-
     try:
         with get_db_session() as session:
             # Check if the collection exists before attempting to delete
@@ -239,4 +241,7 @@ def delete_collection_from_db(collection_name: str) -> None:
         logging.error(f"Error deleting collection from database: {database_exception}")
         raise
 
+    # The collection's embeddings are deleted, so its cached data (matrix, vectors and responses) is stale
+    invalidate_collection_matrix(collection_name)
+
     return
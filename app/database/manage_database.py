@@ -1,9 +1,16 @@
 import logging
+import functools
+import hashlib
+import inspect
+import io
+import struct
+import threading
 import numpy as np
 
 # Package imports
-from typing import List, Tuple
-from psycopg2.extras import RealDictCursor
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import DatabaseError, InterfaceError, IntegrityError
 
@@ -12,6 +19,7 @@ from .base import get_db_session
 from core.celery_app import celery
 from core.config import get_settings
 from .models import Embedding
+from services.cache_service import EmbeddingsCache, ResponsesCache, VersionCounter
 from services.embeddings_service import OpenAIEmbeddingsService
 
 
@@ -20,11 +28,15 @@ This module provides functions to interact with the database.
 
 Functions:
 - get_embedding_from_db(content: str, collection: str): Retrieves the embedding from the database if it exists.
-- get_embeddings_from_collection(collection: str): Retrieves all embeddings from a specific collection.
-- add_embedding(content: str, embedding: np.ndarray, answer: str, collection: str): Adds a new embedding to the database.
-- update_embedding(content: str, new_embedding: np.ndarray, new_answer: str, collection: str): Updates an existing embedding in the database.
-- delete_embedding(content: str, collection: str): Deletes an embedding from the database.
-- delete_collection(collection: str): Deletes a collection and its associated embeddings from the database.
+- get_embedding_vector_from_db(content: str, collection: str): Retrieves the stored embedding vector, going through the local and Redis caches first.
+- get_embeddings_matrix_from_collection(session: Session, collection: str): Streams the embeddings of a collection into a single NumPy matrix.
+- search_for_similarity_in_memory(session: Session, query_embedding: np.ndarray, collection: str): Searches a cached, normalized matrix of the collection with a single matrix product.
+- search_for_similarity_in_db(session: AsyncSession, query_embedding: np.ndarray, collection: str): Awaits the HNSW index search of the collection in the database.
+- add_embedding_to_db(content: str, answer: str, collection: str): Adds a single embedding to the database.
+- add_embeddings_to_db(items: List[Tuple[str, str, str]]): Celery task adding the new embeddings to the database, in batches.
+- delete_embedding_from_db(content: str, collection: str): Deletes an embedding from the database.
+
+The error handling shared by all of them is centralized in the db_operation decorator.
 """
 
 
@@ -34,9 +46,69 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Retrieve the environment variables as settings
 settings = get_settings()
 
+# The number of items per batch of the embeddings tasks, validated once when the settings are loaded
+BATCH_SIZE = settings.batch_size
+
+# The dimension of the stored embeddings, taken from the embeddings table model
+EMBEDDING_DIMENSION = Embedding.__table__.c.embedding.type.dim
+
 # Initialize the embeddings model
 embeddings_service = OpenAIEmbeddingsService()
 
+# The shared version counters of the collections, bumped on every change so each process reloads its cached data
+collection_versions = VersionCounter(namespace="emb:version")
+
+# Two-tier cache of the stored embeddings, keyed by their collection, its version and their content,
+# so a change of the collection in any process makes every cached vector of it stale
+stored_embeddings_cache = EmbeddingsCache(namespace="emb", ttl=int(settings.stored_embeddings_cache_ttl))
+
+# Cache of the final responses to questions, shared with the routes, keyed by the collection version like the vectors
+responses_cache = ResponsesCache(namespace="resp")
+
+# The int8 quantized, normalized embeddings matrices (and their rows' scales) of the collections searched in memory,
+# with the collection version they were loaded at
+collection_matrix_cache: Dict[str, Tuple[Optional[int], List[str], List[str], np.ndarray, np.ndarray]] = {}
+
+# The number of quantized rows dequantized at once by the in-memory search, bounding its temporary float32 memory
+QUANTIZED_SEARCH_BLOCK_ROWS = 4096
+collection_matrix_lock = threading.Lock()
+
+# The in-memory search's float32 scratch buffers, kept per thread (each one's block bounded by the block rows)
+search_buffers = threading.local()
+
+# The header and trailer of PostgreSQL's binary COPY format
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+# The number of fields of each copied embeddings row
+PGCOPY_ROW_FIELDS = struct.pack('>h', 4)
+
+# Build the embedding point-lookup statement once, so every call reuses it (and its cached compiled form)
+# The lookup goes through the (collection, content hash) index, then checks the content itself
+GET_EMBEDDING_STATEMENT = select(Embedding).where(
+    Embedding.collection == bindparam("collection"),
+    Embedding.content_hash == func.decode(func.md5(bindparam("content")), 'hex'),
+    Embedding.content == bindparam("content")
+)
+
+# The similarity threshold above which a search's match is recorded as used
+SIMILARITY_THRESHOLD = float(settings.similarity_threshold)
+
+# The similarity search is the faq_lookup database function, which walks the half precision HNSW index, half the size of
+# a full precision one, reranks its candidates and records the use of its match, in a single round trip
+SEARCH_SIMILAR_EMBEDDING_STATEMENT = text("""
+    SELECT content, embedding, answer, similarity
+    FROM faq_lookup(:query_embedding, :collection, :similarity_threshold);
+""")
+
+# The statements run on every matrix load, prepared once per pooled connection so Postgres reuses their plan
+PREPARED_STATEMENTS = {
+    "count_collection_embeddings": """
+        PREPARE count_collection_embeddings (text) AS
+        SELECT count(*) FROM embeddings WHERE collection = $1;
+    """
+}
+
 
 class DatabaseOperationError(Exception):
     """
@@ -46,6 +118,122 @@ class DatabaseOperationError(Exception):
     pass
 
 
+def hash_content(content: str) -> bytes:
+    """
+    Computes the hash of a content, matching the content_hash column computed by the database.
+
+    :param content: The content to hash.
+    :return: The MD5 digest of the UTF-8 encoded content.
+    """
+    return hashlib.md5(content.encode('utf-8')).digest()
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Scales embeddings to unit length, so their cosine similarity is just their inner product.
+
+    :param embeddings: A single embedding, or a matrix with an embedding per row.
+    :return: The float32 normalized embedding(s), with the same shape.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    return embeddings / np.linalg.norm(embeddings, axis=-1, keepdims=True)
+
+
+def get_search_buffer(name: str, shape: Tuple[int, ...]) -> np.ndarray:
+    """
+    Returns a float32 scratch buffer of the in-memory search, reused by the calls of the current thread.
+    It's only allocated again when it's too small, otherwise a view of its first rows is returned.
+
+    :param name: The name of the buffer.
+    :param shape: The needed shape of the buffer.
+    :return: The float32 buffer, with the needed shape and uninitialized values.
+    """
+    buffer = getattr(search_buffers, name, None)
+
+    if buffer is None or buffer.shape[0] < shape[0] or buffer.shape[1:] != shape[1:]:
+        buffer = np.empty(shape, dtype=np.float32)
+        setattr(search_buffers, name, buffer)
+
+    return buffer[:shape[0]]
+
+
+def get_prepared_connection(session: Session):
+    """
+    Retrieves the DBAPI connection bound to the session's transaction, preparing the statements on its first use.
+    Prepared statements live as long as the database connection, so the pool's connection info records they exist.
+
+    :param session: The database session whose connection is used.
+    :return: The raw psycopg2 connection, on which the prepared statements can be executed.
+    """
+    connection = session.connection()
+
+    if not connection.info.get("statements_prepared"):
+        with connection.connection.cursor() as curs:
+            for prepare_statement in PREPARED_STATEMENTS.values():
+                curs.execute(prepare_statement)
+
+        connection.info["statements_prepared"] = True
+
+    return connection.connection
+
+
+def db_operation(operation: str) -> Callable:
+    """
+    Decorator handling the errors of a database operation in a single place.
+
+    Integrity errors are re-raised as they are, while other database and unexpected errors are wrapped in a DatabaseOperationError.
+    Validation errors (ValueError) are re-raised as they are, as the operations raised them before touching the database,
+    so the callers can tell invalid input apart from database failures.
+    The rollback is left to the get_db_session context manager, which owns the session.
+    It wraps both regular functions and coroutine functions, whose errors are handled once they are awaited.
+
+    :param operation: A short description of the operation, used in the logged and raised error messages.
+    :return: The decorator for the database operation.
+    """
+    def handle_error(operation_excep: Exception) -> None:
+        # Re-raise the error of the operation, wrapping the database and unexpected errors
+        if isinstance(operation_excep, ValueError):
+            raise operation_excep
+
+        if isinstance(operation_excep, IntegrityError):
+            logging.error(f"Failed to {operation} due to an integrity error: {operation_excep}")
+            raise operation_excep
+
+        if isinstance(operation_excep, (DatabaseError, InterfaceError)):
+            logging.error(f"Database error when trying to {operation}: {operation_excep}")
+            raise DatabaseOperationError(f"Failed to {operation}: {operation_excep}") from operation_excep
+
+        logging.error(f"Unexpected error when trying to {operation}: {operation_excep}")
+        raise DatabaseOperationError(f"Unexpected error when trying to {operation}: {operation_excep}") from operation_excep
+
+    def decorator(func: Callable) -> Callable:
+        # The asyncio database operations are awaited within the same error handling
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+
+                except Exception as operation_excep:
+                    handle_error(operation_excep)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+
+            except Exception as operation_excep:
+                handle_error(operation_excep)
+
+        return wrapper
+
+    return decorator
+
+
+@db_operation("retrieve embedding")
 def get_embedding_from_db(content: str, collection: str) -> Embedding:
     """
     Retrieves the embedding from the database if it exists.
@@ -58,88 +246,334 @@ def get_embedding_from_db(content: str, collection: str) -> Embedding:
         logging.error("Content and collection name are required to retrieve an embedding.")
         raise ValueError("Content and collection name cannot be empty.")
 
-    try:
-        with get_db_session() as session:
-            # Perform a query to retrieve the embedding based on content and collection
-            embedding = session.query(Embedding) \
-                            .filter(Embedding.content == content, Embedding.collection == collection) \
-                            .first()
-            
-            # Or like this
-            # result = session.execute(
-            #     select(
-            #         Embedding.content,
-            #         Embedding.embedding,
-            #         Embedding.answer
-            #     ).where(Embedding.content == content, Embedding.collection == collection)
-            # ).fetchone()
-
-            # Retrieve the question's embedding and its associated answer
-            if not embedding:
-                logging.info(f"No embedding found for question '{content}' in collection '{collection}'.")
-            
-            return embedding
-        
-    except IntegrityError as integrity_excep:
-        session.rollback()  # Rollback if an unexpected integrity error occurs
-
-        logging.error(f"Failed to retrieve embedding for question '{content}' in collection '{collection}' due to an integrity error")
-        raise integrity_excep
-    
-    except (DatabaseError, InterfaceError) as database_exception:
-        logging.error(f"Error retrieving embedding from database: {database_exception}")
-        raise DatabaseOperationError(f"Failed to retrieve embedding from database: {database_exception}")
-    
-    except Exception as select_excep:
-        logging.error(f"Unexpected error occured when retrieving embedding: {select_excep}")
-        raise DatabaseOperationError(f"Unexpected error occured when retrieving embedding: {select_excep}")
-
-    return None
-
-
-def get_embeddings_from_collection(collection: str, limit: int = 100) -> List[Embedding]:
-    """
-    Retrieves all embeddings from a specific collection.
-
-    :param collection: The collection to retrieve the embeddings from.
-    :param limit: The maximum number of embeddings to retrieve.
-    :return: A list of Embedding objects or None if an error occurs.
+    with get_db_session() as session:
+        # Perform a query to retrieve the embedding based on content and collection
+        embedding = session.execute(
+            GET_EMBEDDING_STATEMENT,
+            {"content": content, "collection": collection}
+        ).scalars().first()
+
+        # Retrieve the question's embedding and its associated answer
+        if not embedding:
+            logging.info(f"No embedding found for question '{content}' in collection '{collection}'.")
+
+        return embedding
+
+
+@db_operation("retrieve embedding vector")
+def get_embedding_vector_from_db(content: str, collection: str) -> Optional[np.ndarray]:
+    """
+    Retrieves the stored embedding vector of a content, going through the local and Redis caches before the database.
+    The vectors read from the database are stored in both cache tiers, under the current version of their collection.
+    If Redis can't be reached, the version is unknown, so the caches are skipped.
+
+    :param content: The content to look for.
+    :param collection: The collection the content belongs to.
+    :return: The embedding vector if found, otherwise None.
+    """
+    version = collection_versions.get(collection)
+
+    if version is not None:
+        cached_embedding = stored_embeddings_cache.get(collection, str(version), content)
+
+        if cached_embedding is not None:
+            logging.info(f"Embedding for question '{content}' in collection '{collection}' found in cache.")
+            return cached_embedding
+
+    embedding = get_embedding_from_db(content, collection)
+
+    if embedding is None:
+        return None
+
+    embedding_vector = np.asarray(embedding.embedding, dtype=np.float32)
+
+    if version is not None:
+        stored_embeddings_cache.set(embedding_vector, collection, str(version), content)
+
+    return embedding_vector
+
+
+@db_operation("load embeddings matrix from collection")
+def get_embeddings_matrix_from_collection(session: Session, collection: str) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Loads all the embeddings of a collection into a single contiguous float32 matrix.
+
+    The rows are streamed with a server-side (named) cursor, so only a chunk of rows is held by the driver at a time,
+    and each vector is copied straight into its preallocated row of the matrix, without creating Python float objects.
+
+    :param session: The database session to use for the query.
+    :param collection: The collection to load the embeddings from.
+    :return: The contents, the answers and the (number of embeddings, embedding dimension) matrix, in the same order.
     """
     if not collection:
-        logging.error("Collection name is required to retrieve embeddings.")
+        logging.error("Collection name is required to load the embeddings matrix.")
         raise ValueError("Collection name cannot be empty.")
 
-    try:
-        # Run the SQL query using the local session
-        with get_db_session() as session:
-            embeddings = session.query(Embedding) \
-                                .filter(Embedding.collection == collection) \
-                                .limit(limit) \
-                                .all()
-
-            # Return the list of existing embeddings in the collection
-            if not embeddings:
-                logging.info(f"No embeddings found for the collection '{collection}'.")
-
-            return embeddings
-        
-    except IntegrityError as integrity_excep:
-        session.rollback()  # Rollback if an unexpected integrity error occurs
-
-        logging.error(f"Failed to retrieve embeddings from collection '{collection}' due to an integrity error")
-        raise integrity_excep
-    
-    except (DatabaseError, InterfaceError) as database_exception:
-        logging.error(f"Error retrieving embeddings from collection {collection}: {database_exception}")
-        raise DatabaseOperationError(f"Failed to retrieve embeddings from collection {collection}: {database_exception}")
-    
-    except Exception as select_from_collection_excep:
-        logging.error(f"Unexpected error when retrieving embeddings from collection {collection}: {select_from_collection_excep}")
-        raise DatabaseOperationError(f"Unexpected error when retrieving embeddings from collection {collection}: {select_from_collection_excep}")
-    
-    return None
+    # Retrieve the underlying DBAPI connection, bound to the session's transaction
+    raw_connection = get_prepared_connection(session)
+
+    with raw_connection.cursor() as curs:
+        curs.execute("EXECUTE count_collection_embeddings (%s);", (collection,))
+        embeddings_count = curs.fetchone()[0]
+
+    contents = []
+    answers = []
+    embeddings_matrix = None
+
+    with raw_connection.cursor(name="embeddings_matrix_stream") as curs:
+        curs.itersize = 4096
+
+        curs.execute(
+            "SELECT content, answer, embedding FROM embeddings WHERE collection = %s ORDER BY id;",
+            (collection,)
+        )
+
+        for idx, (content, answer, embedding) in enumerate(curs):
+            # Rows inserted after the count are left for the next load
+            if idx == embeddings_count:
+                break
+
+            if embeddings_matrix is None:
+                embeddings_matrix = np.empty((embeddings_count, len(embedding)), dtype=np.float32)
+
+            embeddings_matrix[idx] = embedding
+
+            contents.append(content)
+            answers.append(answer)
+
+    if embeddings_matrix is None:
+        logging.info(f"No embeddings found for the collection '{collection}'.")
+        return [], [], np.empty((0, 0), dtype=np.float32)
 
+    # Rows deleted after the count leave the matrix partially filled
+    embeddings_matrix = embeddings_matrix[:len(contents)]
 
+    logging.info(f"Loaded {len(contents)} embedding(s) from the collection '{collection}'.")
+
+    return contents, answers, embeddings_matrix
+
+
+def quantize_embeddings(embeddings_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantizes the rows of an embeddings matrix to int8, each with its own scale, a quarter of the float32 size.
+    A row is recovered (with an error of at most half its scale per value) as `quantized_row * scale`.
+
+    :param embeddings_matrix: The float32 embeddings matrix to quantize.
+    :return: The int8 quantized matrix and the float32 scale of each row.
+    """
+    scales = np.abs(embeddings_matrix).max(axis=1) / 127
+
+    # Keep the all-zero rows as zeros instead of dividing by a zero scale
+    scales[scales == 0] = 1.0
+
+    quantized_matrix = np.round(embeddings_matrix / scales[:, None]).astype(np.int8)
+
+    return quantized_matrix, scales.astype(np.float32)
+
+
+def invalidate_collection_matrix(collection: str) -> None:
+    """
+    Marks the cached matrix and vectors of a collection as stale, in this process and, through the shared version, in every other one.
+    It must be called once the changes to the collection are committed.
+
+    :param collection: The collection that changed.
+    :return: None
+    """
+    with collection_matrix_lock:
+        collection_matrix_cache.pop(collection, None)
+
+    collection_versions.bump(collection)
+
+
+@db_operation("search for similarity in memory")
+def search_for_similarity_in_memory(
+        session: Session,
+        query_embedding: np.ndarray,
+        collection: str
+    ) -> Tuple[Embedding, float]:
+    """
+    Searches for the most similar embedding to the query embedding in a cached matrix of the collection.
+
+    The matrix is loaded once per process and collection, with its rows normalized, so the cosine similarities with
+    a normalized query are a matrix-vector product, run by BLAS.
+    The cached rows are quantized to int8 with a per-row scale, a quarter of the float32 memory, and are dequantized
+    block by block during the search, so the query itself is never quantized.
+    It is reloaded when the collection's shared version changes, or on every call if Redis can't be reached.
+    This is a fallback for the collections that aren't served well by the HNSW index (e.g. small collections).
+
+    :param session: The database session to use for loading the matrix.
+    :param query_embedding: The embedding of the query to search for.
+    :param collection: The collection to search within.
+    :return: An Embedding object and similarity score if a match is found; otherwise None.
+    """
+    if query_embedding is None or len(query_embedding) == 0 or not collection:
+        logging.error("Query embedding and collection name are required to search for similarity.")
+        raise ValueError("Query embedding and collection name cannot be empty.")
+
+    version = collection_versions.get(collection)
+
+    with collection_matrix_lock:
+        cached_matrix = collection_matrix_cache.get(collection)
+
+    if cached_matrix is not None and version is not None and cached_matrix[0] == version:
+        _, contents, answers, quantized_matrix, scales = cached_matrix
+
+    else:
+        contents, answers, embeddings_matrix = get_embeddings_matrix_from_collection(session, collection)
+
+        if len(contents) > 0:
+            # The embeddings are normalized on write, the rows stored before that are normalized here
+            quantized_matrix, scales = quantize_embeddings(normalize_embeddings(embeddings_matrix))
+
+        else:
+            quantized_matrix, scales = np.empty((0, 0), dtype=np.int8), np.empty(0, dtype=np.float32)
+
+        if version is not None:
+            with collection_matrix_lock:
+                collection_matrix_cache[collection] = (version, contents, answers, quantized_matrix, scales)
+
+    if len(contents) == 0:
+        return None, 0.0
+
+    # The query, the similarities and the dequantized blocks are written into the thread's buffers, instead of
+    # allocating them on every search
+    query_buffer = get_search_buffer("query", (quantized_matrix.shape[1],))
+    np.copyto(query_buffer, query_embedding, casting='unsafe')
+    query_buffer /= np.linalg.norm(query_buffer)
+
+    similarities = get_search_buffer("similarities", (len(contents),))
+
+    # A single contiguous float32 block, reused for every dequantized block instead of allocating one per block
+    block_buffer = get_search_buffer("block", (min(len(contents), QUANTIZED_SEARCH_BLOCK_ROWS), quantized_matrix.shape[1]))
+
+    for start in range(0, len(contents), QUANTIZED_SEARCH_BLOCK_ROWS):
+        end = min(start + QUANTIZED_SEARCH_BLOCK_ROWS, len(contents))
+        block = block_buffer[:end - start]
+
+        np.copyto(block, quantized_matrix[start:end], casting='unsafe')
+
+        # A single matrix-vector product per block, written in place, then the rows' scales are applied to the products
+        np.matmul(block, query_buffer, out=similarities[start:end])
+        similarities[start:end] *= scales[start:end]
+
+    most_similar_index = int(np.argmax(similarities))
+    similarity_score = float(similarities[most_similar_index])
+
+    similar_embedding = Embedding(
+        content=contents[most_similar_index],
+        embedding=quantized_matrix[most_similar_index] * scales[most_similar_index],
+        answer=answers[most_similar_index],
+        collection=collection
+    )
+
+    logging.info(f"Similarity score: {similarity_score:.2f} for content '{similar_embedding.content}'")
+
+    return similar_embedding, similarity_score
+
+
+def build_embeddings_copy_buffer(rows: List[Tuple[str, np.ndarray, str, str]]) -> io.BytesIO:
+    """
+    Encodes the embeddings rows in PostgreSQL's binary COPY format.
+
+    Each row holds the content, embedding, answer and collection, in this order.
+    The text fields are sent as UTF-8 bytes, while the embedding uses pgvector's binary format:
+    the dimension and an unused field as int16, followed by the values as big-endian float4.
+    The embeddings are normalized, as the similarity search relies on stored unit vectors.
+
+    :param rows: A list of tuples containing the content, embedding, answer and collection of each row.
+    :return: A buffer containing the encoded rows, ready to be copied.
+    """
+    buffer = io.BytesIO()
+    buffer.write(PGCOPY_HEADER)
+
+    # Normalize and convert all the embeddings to big-endian float4 at once, instead of packing them value by value
+    embeddings = normalize_embeddings([embedding for _, embedding, _, _ in rows]).astype('>f4')
+    embeddings_bytes = memoryview(embeddings.tobytes())
+
+    # The length prefix and pgvector header of the embedding field are the same for every row
+    dimension = embeddings.shape[1]
+    embedding_size = embeddings.itemsize * dimension
+    embedding_prefix = struct.pack('>ihh', 4 + embedding_size, dimension, 0)
+
+    for idx, (content, _, answer, collection) in enumerate(rows):
+        # Each row starts with its number of fields
+        buffer.write(PGCOPY_ROW_FIELDS)
+
+        # Each field is prefixed by its length in bytes
+        encoded_content = content.encode('utf-8')
+        buffer.write(struct.pack('>i', len(encoded_content)))
+        buffer.write(encoded_content)
+
+        buffer.write(embedding_prefix)
+        buffer.write(embeddings_bytes[idx * embedding_size:(idx + 1) * embedding_size])
+
+        for field in (answer.encode('utf-8'), collection.encode('utf-8')):
+            buffer.write(struct.pack('>i', len(field)))
+            buffer.write(field)
+
+    buffer.write(PGCOPY_TRAILER)
+    buffer.seek(0)
+
+    return buffer
+
+
+def copy_embeddings_to_staging(curs, rows: List[Tuple[str, np.ndarray, str, str]]) -> None:
+    """
+    Streams the embeddings rows into the temporary staging table of the cursor's connection.
+    The binary COPY skips the SQL parsing and the text encoding of the vectors that a regular INSERT goes through.
+
+    :param curs: The cursor of the raw connection, bound to the session's transaction.
+    :param rows: A list of tuples containing the content, embedding, answer and collection of each row.
+    :return: None
+    """
+    # The staging table lives as long as the pooled connection, and is emptied before every use
+    curs.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS staging_embeddings (
+            content TEXT NOT NULL,
+            embedding vector({EMBEDDING_DIMENSION}) NOT NULL,
+            answer TEXT NOT NULL,
+            collection VARCHAR(255) NOT NULL
+        ) ON COMMIT DELETE ROWS;
+
+        TRUNCATE staging_embeddings;
+    """)
+
+    curs.copy_expert(
+        "COPY staging_embeddings (content, embedding, answer, collection) FROM STDIN WITH (FORMAT BINARY)",
+        build_embeddings_copy_buffer(rows)
+    )
+
+
+def upsert_embeddings_to_db(session: Session, rows: List[Tuple[str, np.ndarray, str, str]]) -> None:
+    """
+    Inserts or updates the embeddings rows, within the transaction of the given session.
+
+    The rows are copied into the staging table, then merged into the embeddings table with a single
+    INSERT ... ON CONFLICT DO UPDATE, relying on the unique (collection, content hash) index.
+
+    :param session: The database session to use for the upsert.
+    :param rows: A list of tuples containing the content, embedding, answer and collection of each row.
+    :return: None
+    """
+    if not rows:
+        return
+
+    # Retrieve the underlying DBAPI connection, bound to the session's transaction
+    raw_connection = session.connection().connection
+
+    with raw_connection.cursor() as curs:
+        copy_embeddings_to_staging(curs, rows)
+
+        curs.execute("""
+            INSERT INTO embeddings (content, embedding, answer, collection)
+            SELECT content, embedding, answer, collection
+            FROM staging_embeddings
+            ON CONFLICT (collection, content_hash)
+            DO UPDATE SET embedding = EXCLUDED.embedding, answer = EXCLUDED.answer;
+        """)
+
+
+@db_operation("add embedding")
 def add_embedding_to_db(content: str, answer: str, collection: str) -> None:
     """
     Adds a single embedding to the database.
@@ -153,58 +587,47 @@ def add_embedding_to_db(content: str, answer: str, collection: str) -> None:
         logging.error("Content, answer, and collection name are required to add an embedding.")
         raise ValueError("Content, answer, and collection name cannot be empty.")
 
-    try:
-        # Run the SQL query using the local session
-        with get_db_session() as session:
-            # Check if the embedding already exists in the database
-            existing_embedding = get_embedding_from_db(content, collection)
+    # Run the SQL query using the local session
+    with get_db_session() as session:
+        # Check if the embedding already exists (in the cache or the database)
+        existing_embedding = get_embedding_vector_from_db(content, collection)
 
-            if existing_embedding is None:
-                logging.info(f"Adding embedding for content '{content}' to collection '{collection}'...")
+        if existing_embedding is None:
+            logging.info(f"Adding embedding for content '{content}' to collection '{collection}'...")
 
-                # Compute the embedding for the content
-                content_embedding = embeddings_service.compute_embedding(content)
+            # Compute the embedding for the content, stored normalized like every other embedding
+            content_embedding = normalize_embeddings(embeddings_service.compute_embedding(content))
 
-                # Create an SQLAlchemy object
-                embedding_object = Embedding(
-                    content=content,
-                    embedding=content_embedding,
-                    answer=answer,
-                    collection=collection
-                )
-
-                # Add the object to the session
-                session.add(embedding_object)
-
-                logging.info(f"Added embedding for content '{content}' to collection '{collection}'.")
-            
-            else:
-                logging.warning(f"Embedding for content '{content}' already exists in collection '{collection}'.")
-                return
-    
-    except IntegrityError as integrity_excep:
-        session.rollback()  # Rollback if an unexpected integrity error occurs
+            # Create an SQLAlchemy object
+            embedding_object = Embedding(
+                content=content,
+                embedding=content_embedding,
+                answer=answer,
+                collection=collection
+            )
 
-        logging.error(f"Failed to add embedding for question '{content}' in collection '{collection}' due to an integrity error")
-        raise integrity_excep
+            # Add the object to the session
+            session.add(embedding_object)
 
-    except (DatabaseError, InterfaceError) as database_exception:
-        logging.error(f"Error adding embedding to database: {database_exception}")
-        raise DatabaseOperationError(f"Failed to add embedding: {database_exception}")
+        else:
+            logging.warning(f"Embedding for content '{content}' already exists in collection '{collection}'.")
+            return
 
-    except Exception as insert_excep:
-        logging.error(f"Unexpected error when adding embedding to database: {insert_excep}")
-        raise DatabaseOperationError(f"Unexpected error when adding embedding to database: {insert_excep}")
+    # The session is committed, so the collection's cached matrix and vectors can be reloaded
+    invalidate_collection_matrix(collection)
 
-    return
+    logging.info(f"Added embedding for content '{content}' to collection '{collection}'.")
 
 
 @celery.task(bind=True, max_retries=5, default_retry_delay=60)
+@db_operation("add embeddings")
 def add_embeddings_to_db(self, items: List[Tuple[str, str, str]]) -> None:
     """
     Adds embeddings to the database in batches, specified by the batch size Pydantic setting.
     It handles large batches by splitting them into smaller chunks.
     It checks if the embedding already exists in the database before inserting it.
+    The embeddings of the batches are computed concurrently, on the embeddings service's thread pool.
+    Each batch is upserted as soon as its embeddings are ready, so memory doesn't grow with the number of items.
 
     The @celery.task decorator is used to make this function a Celery task, allowing it to be executed asynchronously.
     There is also a retry mechanism with a delay between retries in case of database errors or unexpected exceptions.
@@ -217,158 +640,107 @@ def add_embeddings_to_db(self, items: List[Tuple[str, str, str]]) -> None:
     if not items or 0 == len(items):
         logging.error("No items provided to add embeddings.")
         raise ValueError("Items list cannot be empty.")
-    
+
     # Add a check to see if the task has somehow failed 2 times
     if self.request.retries > 2:
         logging.warning("Tried adding embeddings more than twice!")
 
-    try:
-        # Run the SQL query using the local Session
-        with get_db_session() as session:
-            batch_size = int(settings.batch_size)
-
-            for idx in range(0, len(items), batch_size):
-                batch = items[idx:idx + batch_size]
-
-                embeddings_to_insert = []
-
-                for content, answer, collection in batch:
-                    # Check if the embedding already exists in the database
-                    existing_embedding = get_embedding_from_db(content, collection)
-
-                    # If it didn't exist before
-                    if existing_embedding is None:
-                        # Compute the new embedding
-                        content_embedding = embeddings_service.compute_embedding(content)
-                        
-                        # Create an SQLAlchemy object
-                        embedding_object = Embedding(
-                            content=content,
-                            embedding=content_embedding,
-                            answer=answer,
-                            collection=collection
-                        )
-                        
-                        # Append it to the list of objects
-                        embeddings_to_insert.append(embedding_object)
-
-                        logging.info(f"Added embedding for content '{content}' to the list to add to collection '{collection}'")
-
-                    else:
-                        logging.warning(f"Embedding for content '{content}' already exists in collection '{collection}'!")
-                        return
-
-            # If we actually have stuff to add
-            if embeddings_to_insert:
-                # Add all objects in a single batch insert
-                # SQLAlchemy automatically batches inserts with add_all()
-                session.add_all(embeddings_to_insert)
-
-                logging.info(f"Added {len(embeddings_to_insert)} embedding(s) to the database.")
-
-    except IntegrityError as integrity_excep:
-        session.rollback()  # Rollback if an unexpected integrity error occurs
-
-        logging.error(f"Failed to add embeddings in collection '{collection}' due to an integrity error")
-        raise integrity_excep
-    
-    except (DatabaseError, InterfaceError) as database_exception:
-        logging.error(f"Error adding embeddings to database: {database_exception}")
-        raise DatabaseOperationError(f"Failed to add embeddings: {database_exception}")
-    
-    except Exception as insert_excep:
-        logging.error(f"Unexpected error when adding embeddings to database: {insert_excep}")
-        raise DatabaseOperationError(f"Unexpected error when adding embeddings to database: {insert_excep}")
-
-    return
+    # Run the SQL query using the local Session
+    with get_db_session() as session:
+        # Keep, for every batch, only the items that don't have a stored embedding yet
+        pending_batches = []
 
+        for idx in range(0, len(items), BATCH_SIZE):
+            batch = items[idx:idx + BATCH_SIZE]
 
-@celery.task(bind=True, max_retries=5, default_retry_delay=60)
-def update_embeddings_in_db(self, items: List[Tuple[str, str, str]]) -> None:
-    """
-    Updates the embeddings in the database in batches, using the batch size Pydantic setting.
-    It handles large batches by splitting them into smaller chunks.
-    It checks if the embedding already exists in the database before updating it.
+            # Check which embeddings of the batch already exist in the database, using a single query
+            existing_rows = session.execute(
+                select(Embedding.content, Embedding.collection).where(
+                    tuple_(Embedding.collection, Embedding.content_hash).in_(
+                        [(collection, hash_content(content)) for content, _, collection in batch]
+                    )
+                )
+            ).all()
 
-    The @celery.task decorator is used to make this function a Celery task, allowing it to be executed asynchronously.
-    There is also a retry mechanism with a delay between retries in case of database errors or unexpected exceptions.
-    It makes use of celery's _task_ _binding_ to give access to the task's `metadata`, retry management and error handling.
+            existing_keys = {(content, collection) for content, collection in existing_rows}
 
-    :param items: A list of tuples containing the content (question), answer and collection for each embedding.
-    :return: None
-    """
-    if not items or 0 == len(items):
-        logging.error("No items provided to update embeddings.")
-        raise ValueError("Items cannot be empty.")
-    
-    # Add a check to see if the task has somehow failed 2 times
-    if self.request.retries > 2:
-        logging.warning("Tried updating embeddings more than twice!")
+            pending_batch = []
 
-    try:
-        # Run the SQL query using the local Session
-        with get_db_session() as session:
-            batch_size = int(settings.batch_size)
+            for content, answer, collection in batch:
+                # If it didn't exist before
+                if (content, collection) not in existing_keys:
+                    pending_batch.append((content, answer, collection))
 
-            for idx in range(0, len(items), batch_size):
-                batch = items[idx:idx + batch_size]
+                    # Also skip the duplicates within the items
+                    existing_keys.add((content, collection))
 
-                for content, answer, collection in batch:
-                    # Check if the embedding already exists in the database
-                    existing_embedding = get_embedding_from_db(content, collection)
+                else:
+                    logging.warning(f"Embedding for content '{content}' already exists in collection '{collection}'!")
 
-                    # If it existed before
-                    if existing_embedding is not None:
-                        # Compute the new embedding
-                        embedding = embeddings_service.compute_embedding(content)
+            if pending_batch:
+                pending_batches.append(pending_batch)
 
-                        # Update the in-memory object
-                        existing_embedding.embedding = embedding
-                        existing_embedding.answer = answer
+        if not pending_batches:
+            logging.info("No new embeddings to add to the database.")
+            return
 
-                        logging.info(f"Updated '{content}'s embedding.")
+        # Compute the embeddings of the batches concurrently, so the OpenAI HTTP calls overlap
+        # The batches' embeddings are returned in order, so the vectors can be zipped back with their items
+        batches_embeddings = embeddings_service.compute_concurrent_batch_embeddings(
+            [[content for content, _, _ in batch] for batch in pending_batches]
+        )
 
-                    else:
-                        logging.info(f"Cannot update embedding for content '{content}' because it does not exist in collection '{collection}'!")
-                        return
-    
-    except IntegrityError as integrity_excep:
-        session.rollback()  # Rollback if an unexpected integrity error occurs
+        added_embeddings = 0
 
-        logging.error(f"Failed to update embeddings in collection '{collection}' due to an integrity error")
-        raise integrity_excep
+        for batch, batch_embeddings in zip(pending_batches, batches_embeddings):
+            embeddings_to_insert = []
 
-    except (DatabaseError, InterfaceError) as database_exception:
-        logging.error(f"Error updating embeddings in database: {database_exception}")
-        raise DatabaseOperationError(f"Failed to update embeddings: {database_exception}")
-    
-    except Exception as update_excep:
-        logging.error(f"Unexpected error when updating embeddings in database: {update_excep}")
-        raise DatabaseOperationError(f"Unexpected error when updating embeddings in database: {update_excep}")
+            for (content, answer, collection), content_embedding in zip(batch, batch_embeddings):
+                # Append the row to the list of rows to copy
+                embeddings_to_insert.append((content, content_embedding, answer, collection))
 
-    return
+                logging.info(f"Added embedding for content '{content}' to the list to add to collection '{collection}'")
 
+            # Stream the rows of the batch to the database, so memory stays bounded by the batch size
+            upsert_embeddings_to_db(session, embeddings_to_insert)
 
-def search_for_similarity_in_db(
-        session: Session,
-        query_embedding: np.ndarray, 
+            added_embeddings += len(embeddings_to_insert)
+
+    # The session is committed, so the changed collections' cached matrices can be reloaded
+    for collection in {collection for batch in pending_batches for _, _, collection in batch}:
+        invalidate_collection_matrix(collection)
+
+    logging.info(f"Added {added_embeddings} embedding(s) to the database.")
+
+
+@db_operation("search for similarity")
+async def search_for_similarity_in_db(
+        session: AsyncSession,
+        query_embedding: np.ndarray,
         collection: str
     ) -> Tuple[Embedding, float]:
     """
     Searches for the most similar embedding to the query embedding directly in the database.
+    The query is awaited on an asyncio session, so the event loop keeps serving other requests meanwhile.
 
     Why is this better than an in-memory similiarity search?
-    
-    1.  The usage of a database query: The similarity search is done using an SQL query that runs on the PostgreSQL database. 
-        The embeddings are stored in a table, and the search is performed on this table `(SELECT content, answer, 1 - (embedding <=> %s::vector))`, which returns the most similar result.
 
-    2.  pgvector: The `<=>` operator is specific to `pgvector` for computing the distance between vectors (embeddings). 
+    1.  The usage of a database query: The similarity search is done using an SQL query that runs on the PostgreSQL database.
+        The embeddings are stored in a table, and the search is performed on this table `(SELECT content, answer, (embedding <#> $1) * -1)`, which returns the most similar result.
+        The query lives in the faq_lookup database function, which also records the use of a match above the similarity threshold,
+        so a match costs a single round trip. Its call is prepared and cached by asyncpg on every connection, and the function's own plan is cached.
+
+    2.  pgvector: The `<#>` operator is specific to `pgvector` for computing the (negative) inner product between vectors (embeddings).
+        The stored and query embeddings are normalized, so it is the cosine similarity, without the norms computed by `<=>`.
         This computation happens inside the database.
 
-    3.  Efficient Vector Search: Since the search is happening directly on the database level, it's more scalable and efficient for large datasets, 
+    3.  Efficient Vector Search: Since the search is happening directly on the database level, it's more scalable and efficient for large datasets,
         as it leverages the database's indexing and optimized search capabilities, rather than loading all embeddings into memory.
-    
-    :param session: The database session to use for the search.
+        The query orders by the negative inner product, so it is served by the HNSW (inner product) index on the embedding column.
+        The index is built on the half precision embeddings, so it moves half the bytes, and its best candidates
+        are reranked with the full precision embeddings.
+
+    :param session: The asyncio database session to use for the search.
     :param query_embedding: The embedding of the query to search for.
     :param collection: The collection to search within.
     :return: An Embedding object and similarity score if a match is found; otherwise None.
@@ -376,74 +748,44 @@ def search_for_similarity_in_db(
     if not session:
         logging.error("No database session provided to search for similarity.")
         raise ValueError("Database session cannot be empty.")
-    
-    if not query_embedding or not collection:
+
+    if query_embedding is None or len(query_embedding) == 0 or not collection:
         logging.error("Query embedding and collection name are required to search for similarity.")
         raise ValueError("Query embedding and collection name cannot be empty.")
 
-    try:
-        # A bit of a hack to be able to use pgvector's <=> operator in SQLAlchemy
-        # Retrieve the underlying DBAPI connection from the SQLAlchemy engine
-        raw_connection = session.connection().connection
-
-        # Create a cursor which returns results as dictionaries
-        with raw_connection.cursor(cursor_factory=RealDictCursor) as curs:
-
-            # It sorts the most similar embeddings to the prompt embedding (by using pgvector's <=> operator) descendingly
-            search_query = """
-                SELECT content, answer, 1 - (embedding <=> %s::vector) AS similarity
-                FROM embeddings
-                WHERE collection = %s
-                ORDER BY similarity DESC
-                LIMIT 1;
-            """
-
-            # Execute the query using the cursor
-            curs.execute(
-                search_query,
-                (query_embedding, collection)
-            )
-
-            # Grab a single result from the query
-            result = curs.fetchone()
-
-        # If we actually get a result
-        if result:
-            # Retrieve the embedding for the matched content
-            embedding = get_embedding_from_db(result['content'], collection)
-
-            # Construct an Embedding object
-            similar_embedding = Embedding(
-                content=result['content'],
-                embedding=embedding,
-                answer=result['answer'],
-                collection=collection
-            )
-
-            # Retrieve the similarity score
-            similarity_score = result['similarity']
-
-            logging.info(f"Similarity score: {similarity_score:.2f} for content '{similar_embedding.content}'")
-            
-            return similar_embedding, similarity_score
-    
-    except IntegrityError as integrity_excep:
-        session.rollback()  # Rollback if an unexpected integrity error occurs
-
-        logging.error(f'Failed to search for similarity in collection {collection} due to an integrity error')
-        raise integrity_excep
-
-    except (DatabaseError, InterfaceError) as database_exception:
-        logging.error(f"Error searching for similarity in the database: {database_exception}")
-        raise DatabaseOperationError(f"Failed to search for similarity: {database_exception}")
-    
-    except Exception as similiarity_search_error:
-        logging.error(f"Unexpected error when searching for similarity in the database: {similiarity_search_error}")
-        raise DatabaseOperationError(f"Unexpected error when searching for similarity in the database: {similiarity_search_error}")
+    # The function sorts the most similar embeddings to the prompt embedding (by using pgvector's <#> operator),
+    # sets the size of the HNSW candidates list itself, and records the use of a match above the threshold
+    # The embedding is bound natively by pgvector's codec, registered on every connection
+    result = (await session.execute(
+        SEARCH_SIMILAR_EMBEDDING_STATEMENT,
+        {
+            "query_embedding": normalize_embeddings(query_embedding),
+            "collection": collection,
+            "similarity_threshold": SIMILARITY_THRESHOLD
+        }
+    )).mappings().first()
+
+    # If we actually get a result
+    if result:
+        # Construct an Embedding object, the stored embedding is already fetched as a NumPy array
+        similar_embedding = Embedding(
+            content=result['content'],
+            embedding=result['embedding'],
+            answer=result['answer'],
+            collection=collection
+        )
+
+        # Retrieve the similarity score
+        similarity_score = result['similarity']
+
+        logging.info(f"Similarity score: {similarity_score:.2f} for content '{similar_embedding.content}'")
+
+        return similar_embedding, similarity_score
 
     return None, 0.0
 
 
+@db_operation("delete embedding")
 def delete_embedding_from_db(content: str, collection: str) -> Embedding:
     """
     Deletes the embedding from the database.
@@ -457,42 +799,22 @@ def delete_embedding_from_db(content: str, collection: str) -> Embedding:
         logging.error("Content and collection name are required to delete an embedding.")
         raise ValueError("Content and collection name cannot be empty.")
 
-    try:
-        # Prepare the embedding object that will be deleted
-        embedding_to_return = None
-        
-        with get_db_session() as session:
-            # Check if the embedding already exists in the database
-            embedding_to_delete = get_embedding_from_db(content, collection)
-
-            # If it existed before
-            if embedding_to_delete is not None:
-                # Save the embedding object that will be deleted
-                embedding_to_return = embedding_to_delete
-
-                logging.info(f"Deleting embedding for content '{content}' from collection '{collection}'")
-                
-                # Delete that embedding
-                session.delete(embedding_to_delete)
-
-                return embedding_to_return
-
-            else:
-                logging.error(f'The question {content} does not have a stored embedding!')
-                raise ValueError(f'Embedding for the question "{content}" not found in collection "{collection}"!')
-    
-    except IntegrityError as integrity_excep:
-        session.rollback()  # Rollback if an unexpected integrity error occurs
-
-        logging.error(f'Failed to delete embedding from collection {collection} due to an integrity error')
-        raise integrity_excep
-
-    except (DatabaseError, InterfaceError) as database_exception:
-        logging.error(f"Error deleting embedding from database: {database_exception}")
-        raise DatabaseOperationError(f"Failed to delete embedding: {database_exception}")
-    
-    except Exception as delete_excep:
-        logging.error(f"Unexpected error when deleting embedding from database: {delete_excep}")
-        raise DatabaseOperationError(f"Unexpected error when deleting embedding from database: {delete_excep}")
-
-    return
+    with get_db_session() as session:
+        # Check if the embedding already exists in the database
+        embedding_to_delete = get_embedding_from_db(content, collection)
+
+        # If it existed before
+        if embedding_to_delete is not None:
+            logging.info(f"Deleting embedding for content '{content}' from collection '{collection}'")
+
+            # Delete that embedding
+            session.delete(embedding_to_delete)
+
+        else:
+            logging.error(f'The question {content} does not have a stored embedding!')
+            raise ValueError(f'Embedding for the question "{content}" not found in collection "{collection}"!')
+
+    # The session is committed, so the collection's cached matrix and vectors (in both cache tiers) can be reloaded
+    invalidate_collection_matrix(collection)
+
+    return embedding_to_delete
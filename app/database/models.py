@@ -1,5 +1,5 @@
 # Package imports
-from sqlalchemy import Column, Integer, Text, String
+from sqlalchemy import Column, Computed, DateTime, Integer, LargeBinary, Text, String, UniqueConstraint
 from pgvector.sqlalchemy import Vector
 
 # Local files imports
@@ -45,6 +45,12 @@ class Embedding(Base):
     """
     __tablename__ = 'embeddings'
 
+    # A content is stored once per collection, which also lets the writes be done as upserts
+    # The constraint uses the content's hash, so its index stays small whatever the content length
+    __table_args__ = (
+        UniqueConstraint('collection', 'content_hash', name='embeddings_collection_content_hash_key'),
+    )
+
     # Define the table columns
     id = Column(
         Integer, 
@@ -72,6 +78,18 @@ class Embedding(Base):
         nullable=False
     )
 
+    # The MD5 hash of the content, computed by the database
+    content_hash = Column(
+        LargeBinary,
+        Computed("decode(md5(content), 'hex')", persisted=True)
+    )
+
+    # When the embedding last answered a question, recorded by the faq_lookup database function
+    last_used = Column(
+        DateTime(timezone=True),
+        nullable=True
+    )
+
 
     """
     # For the collections table to be included, the 'embeddings' table would need a foreign key relationship
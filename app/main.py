@@ -2,14 +2,15 @@ import logging
 
 # Package imports
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 
 # Local files imports
 from routers import auth, questions, collections
-from core.templates import templates
+from core.templates import render_static_page
 from core.lifespan import lifespan
 from core.handlers import validation_exception_handler
+from core.logging_config import setup_queued_logging
 
 
 """
@@ -24,12 +25,12 @@ The app is launched with Uvicorn and served on the specified host and port via t
 """
 
 
-# Set the logging config
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Set the logging config, writing the log records from a background thread
+setup_queued_logging()
 
 
-# Define the FastAPI main app
-app = FastAPI(lifespan=lifespan)
+# Define the FastAPI main app, serializing the JSON responses with orjson
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 # Add an exception handler with a custom method
@@ -51,11 +52,11 @@ async def home(request: Request):
     Route for loading the login (home) page.
 
     :param request: The request object.
-    :return: The rendered HTML template for the homepage.
+    :return: The pre-rendered HTML of the homepage.
     """
-    # Serve the homepage with the login form
+    # Serve the homepage with the login form, rendered once and cached as bytes
     try:
-        return templates.TemplateResponse("login.html", {"request": request})
+        return HTMLResponse(content=render_static_page("login.html"))
     
     except Exception as home_render_excep:
         logging.error(f"Error rendering home page: {home_render_excep}")
@@ -1,14 +1,12 @@
 import logging
 
 # Package imports
-from datetime import timedelta
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
 from jwt import PyJWTError
 
 # Local files imports
-from auth.auth_utils import create_access_token, authenticate_user
-from core.config import get_settings
+from auth.auth_utils import create_access_token, authenticate_user, default_access_token_expires
 from schemas.token_schema import Token
 
 
@@ -19,12 +17,6 @@ login_for_access_token: Handles the login process and returns an access token if
 """
 
 
-# Set the logging config
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Retrieve the Pydantic settings
-settings = get_settings()
-
 # Define the router for binding the routes to the main FastAPI app
 router = APIRouter()
 
@@ -52,19 +44,9 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             logging.error(f"Authentication failed for user: {form_data.username}")
             raise AuthenticationError("Incorrect username or password")
         
-        if not user:
-            logging.error(f"Authentication failed for user: {form_data.username}")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        access_token_expires = timedelta(minutes=int(settings.access_token_expire_minutes))
-
         # Create access token
         access_token = create_access_token(
-            data={"sub": user["username"]}, expires_delta=access_token_expires
+            data={"sub": user["username"]}, expires_delta=default_access_token_expires
         )
 
         # Returns the token
@@ -79,7 +61,11 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     
     except AuthenticationError as auth_excep:
         logging.error(f"Authentication error during login: {auth_excep}")
-        raise HTTPException(status_code=401, detail=str(auth_excep))
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(auth_excep),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
     except Exception as token_validation_excep:
         logging.error(f"Error during login: {token_validation_excep}")
@@ -1,14 +1,21 @@
 import logging
+import hashlib
 
 # Package imports
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from typing_extensions import Annotated
 
 # Local files imports
 from dependencies import TokenData, get_token
-from schemas.collection_schema import Collection
+from schemas.collection_schema import COLLECTION_NAME_MAX_LENGTH, COLLECTION_NAME_PATTERN, Collection, CollectionRequest, \
+                                        PaginatedCollections
 from database.manage_collections import add_collection_to_db, get_collection_from_db, \
                     get_collections_from_db, update_collection_in_db, delete_collection_from_db
+from database.manage_database import get_embeddings_matrix_from_collection
+from utils.utils import get_database_session
 
 
 """
@@ -17,88 +24,208 @@ This module defines the FastAPI router for the collections routes.
 Methods:
 - create_collection: Creates a new collection.
 - get_collection_by_name: Retrieves a collection by its name.
-- get_collections: Retrieves a list of collections.
+- get_collections: Retrieves a page of collections, paginated with a cursor.
 - update_collection: Updates a collection.
 - delete_collection: Deletes a collection.
+- get_collection_embeddings: Retrieves the embeddings of a collection, as JSON or as a raw float32 buffer.
+
+The collection and collections pages are sent with an ETag, so the clients revalidating an unchanged one get an empty 304 response.
 
 Some work could be done in improving the user experience in managing collections.
 """
 
 
-# Set the logging config
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
 # Define the FastAPI router to bind collections routes
 router = APIRouter()
 
+# The media type of the raw (row-major, little-endian) float32 embeddings buffer
+FLOAT32_MEDIA_TYPE = "application/x-float32"
+
+# The collection names passed in the path and the query, validated like the collection schema's
+CollectionNamePath = Annotated[str, Path(min_length=1, max_length=COLLECTION_NAME_MAX_LENGTH, pattern=COLLECTION_NAME_PATTERN)]
+CollectionNameQuery = Annotated[str, Query(min_length=1, max_length=COLLECTION_NAME_MAX_LENGTH, pattern=COLLECTION_NAME_PATTERN)]
+
+
+def make_etag(*parts: str) -> str:
+    """
+    Builds the strong ETag of a response from the values it is serialized from.
+
+    :param parts: The values of the response.
+    :return: The quoted ETag.
+    """
+    digest = hashlib.blake2s("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Checks whether the request's If-None-Match header matches an ETag, i.e. the client's copy is still up to date.
+
+    :param request: The request object.
+    :param etag: The ETag of the current response.
+    :return: True if the client's copy matches the ETag.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+
+    if not if_none_match:
+        return False
+
+    client_etags = []
+
+    for client_etag in if_none_match.split(","):
+        client_etag = client_etag.strip()
+
+        # The weak comparison is used, so the W/ prefix of weak ETags is ignored
+        client_etags.append(client_etag[2:] if client_etag.startswith("W/") else client_etag)
+
+    return "*" in client_etags or etag in client_etags
+
 
 @router.post("/collections", response_model=Collection)
-async def create_collection(collection: Collection, token: TokenData = Depends(get_token)):
+def create_collection(collection: CollectionRequest, token: TokenData = Depends(get_token)):
     """
     FastAPI router method to create a new collection.
 
     :param collection: The collection object to be created.
     :return: The created collection object.
     """
-    logging.info(f"Creating a new collection named '{collection.name}'")
+    logging.info("Creating a new collection named '%s'", collection.name)
 
-    return await add_collection_to_db(collection)
+    return add_collection_to_db(collection.name)
 
 
 @router.get("/collections/{collection_name}", response_model=Collection)
-async def get_collection_by_name(collection_name: str, token: TokenData = Depends(get_token)):
+def get_collection_by_name(
+    collection_name: CollectionNamePath,
+    request: Request,
+    response: Response,
+    token: TokenData = Depends(get_token)
+    ):
     """
     FastAPI router method to retrieve a collection by its name.
+    It's sent with an ETag, and an empty 304 response is returned if the client's copy matches it.
 
     :param collection_name: The name of the collection to retrieve.
+    :param request: The request object.
+    :param response: The response object, which carries the ETag.
     :return: The retrieved collection object.
     """
-    logging.info(f"Retrieving collection named '{collection_name}'...")
+    logging.info("Retrieving collection named '%s'...", collection_name)
 
-    collection = await get_collection_from_db(collection_name)
+    collection = get_collection_from_db(collection_name)
     
     if not collection:
-        logging.error(f"Collection {collection_name} not found")
+        logging.error("Collection %s not found", collection_name)
         raise HTTPException(status_code=404, detail="Collection not found")
-    
-    return collection
 
+    etag = make_etag(collection_name)
 
-@router.get("/collections", response_model=List[Collection])
-async def get_collections(limit: int = 10, token: TokenData = Depends(get_token)):
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+
+    return Collection(name=collection_name)
+
+
+@router.get("/collections", response_model=PaginatedCollections)
+def get_collections(
+    request: Request,
+    response: Response,
+    limit: int = 10,
+    after: Optional[str] = None,
+    token: TokenData = Depends(get_token)
+    ):
     """
-    FastAPI router method to retrieve a list of collections.
+    FastAPI router method to retrieve a page of collections, ordered by name.
+    The next page is retrieved by passing the returned `next_cursor` as `after`.
+    It's sent with an ETag, and an empty 304 response is returned if the client's copy matches it.
 
+    :param request: The request object.
+    :param response: The response object, which carries the ETag.
     :param limit: The maximum number of collections to retrieve.
-    :param offset: The number of collections to skip.
-    :return: A list of collection objects.
+    :param after: Optional, the cursor returned with the previous page.
+    :return: The page of collection objects and the cursor of the next page.
     """
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="The limit must be positive!")
+
     logging.info("Retrieving collections...")
 
-    return await get_collections_from_db(limit)
+    collections = get_collections_from_db(limit, after) or []
+
+    # A full page may be followed by others, so it carries the cursor of the next one
+    next_cursor = collections[-1].name if len(collections) == limit else None
+
+    # The page is identified by its collections and its cursor
+    etag = make_etag(*(collection.name for collection in collections), next_cursor or "")
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+
+    return PaginatedCollections(items=collections, next_cursor=next_cursor)
 
 
 @router.put("/collections", response_model=Collection)
-async def update_collection(collection: Collection, new_collection_name: str, token: TokenData = Depends(get_token)):
+def update_collection(collection: CollectionRequest, new_collection_name: CollectionNameQuery, token: TokenData = Depends(get_token)):
     """
     FastAPI router method to update a collection.
 
     :param collection: The collection object to be updated.
     :return: The updated collection object.
     """
-    logging.info(f"Updating '{collection.name}' to {new_collection_name}...")
+    logging.info("Updating '%s' to %s...", collection.name, new_collection_name)
 
-    return await update_collection_in_db(collection.name, new_collection_name)
+    return update_collection_in_db(collection.name, new_collection_name)
 
 
 @router.delete("/collections/{collection_name}")
-async def delete_collection(collection_name: str, token: TokenData = Depends(get_token)):
+def delete_collection(collection_name: CollectionNamePath, token: TokenData = Depends(get_token)):
     """
     FastAPI router method to delete a collection.
 
     :param collection_name: The name of the collection to be deleted.
     :return: A success message.
     """
-    logging.info(f"Deleting '{collection_name}'...")
+    logging.info("Deleting '%s'...", collection_name)
     
-    return await delete_collection_from_db(collection_name)
+    return delete_collection_from_db(collection_name)
+
+
+@router.get("/collections/{collection_name}/embeddings")
+def get_collection_embeddings(
+    collection_name: CollectionNamePath,
+    request: Request,
+    token: TokenData = Depends(get_token),
+    database_session: Session = Depends(get_database_session)
+    ) -> Response:
+    """
+    FastAPI router method to retrieve the embeddings of a collection.
+
+    The response is negotiated with the Accept header: JSON by default, or, for `application/x-float32`,
+    the raw float32 matrix, about 4 times smaller and read without any parsing, e.g. with
+    `np.frombuffer(response.content, dtype=np.float32).reshape(rows, columns)`, using the X-Embeddings-Shape header.
+    The rows are in the same order as the contents of the JSON response.
+
+    :param collection_name: The name of the collection whose embeddings to retrieve.
+    :param request: The request object.
+    :return: The contents and embeddings of the collection, either as JSON or as a float32 buffer.
+    """
+    logging.info("Retrieving the embeddings of the collection '%s'...", collection_name)
+
+    contents, _, embeddings_matrix = get_embeddings_matrix_from_collection(database_session, collection_name)
+
+    if FLOAT32_MEDIA_TYPE in request.headers.get("Accept", ""):
+        rows, columns = embeddings_matrix.shape
+
+        return Response(
+            content=embeddings_matrix.astype('<f4', copy=False).tobytes(),
+            media_type=FLOAT32_MEDIA_TYPE,
+            headers={"X-Embeddings-Shape": f"{rows},{columns}"}
+        )
+
+    # orjson serializes the NumPy matrix natively, without converting it to Python floats first
+    return ORJSONResponse(content={"contents": contents, "embeddings": embeddings_matrix})
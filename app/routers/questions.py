@@ -1,22 +1,31 @@
 import logging
+import asyncio
+import orjson
 
 # Package imports
 from fastapi import APIRouter, HTTPException, Request, Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from requests import RequestException
+from typing import AsyncIterator, Optional, Union
+from httpx import HTTPError
 
 # Local files imports
 from dependencies import get_token
-from database.manage_database import search_for_similarity_in_db, add_embeddings_to_db, update_embeddings_in_db
+from database.manage_database import search_for_similarity_in_db, search_for_similarity_in_memory, \
+                        collection_versions, responses_cache
 from core.config import get_settings
-from core.templates import templates
+from core.templates import render_static_page
 from sqlalchemy.exc import SQLAlchemyError
 from schemas.question_schema import Question, QuestionResponse
 from schemas.token_schema import TokenData
-from services.embeddings_service import OpenAIEmbeddingsService, EmbeddingComputationError
+from services.answers_service import generate_openai_answer, read_answer_events
+from services.embeddings_batcher_service import query_embeddings_batcher
+from services.embeddings_service import EmbeddingComputationError
 from services.llm_service import OpenAI_Responder
-from utils.utils import get_database_session, get_openai_responder, \
+from services.task_queue_service import add_embeddings_queue
+from utils.utils import get_async_database_session, get_database_session, get_openai_responder, \
                         get_faq_collection_name
 
 
@@ -26,27 +35,99 @@ This module defines the routes and functionality for handling user questions and
 ask_question: Handles the user's question, computes the similarity with the existing embeddings,
               and returns the most similar question and answer.
 
+stream_answer: Streams an answer generated in the background, for the questions asked with `Prefer: respond-async`.
+
 question_page: Renders the HTML template for the question page.
 
 It also includes error handling and logging mechanisms for better debugging and monitoring.
 """
 
 
-# Set the logging config
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Get a singleton instance of the OpenAI embeddings model
-embeddings_service = OpenAIEmbeddingsService()
-
 # Retrieve the environment variables
 settings = get_settings()
 
 # Retrieve the similarity threshold
 similarity_threshold = float(settings.similarity_threshold)
 
+# Retrieve the initial collection name, constant for the app's lifetime
+faq_collection_name = get_faq_collection_name()
+
+# Whether the OpenAI fallback is started alongside the similarity search, trading OpenAI requests for the misses' latency
+speculative_openai_responses = settings.speculative_openai_responses
+
+# Whether to search a cached matrix of the collection in memory instead of the HNSW index
+similarity_search_in_memory = settings.similarity_search_in_memory
+
+# The database session used by the similarity search: the in-memory search loads the matrix with the synchronous driver,
+# while the HNSW index search is awaited, so a request only opens the session its search uses
+get_search_database_session = get_database_session if similarity_search_in_memory else get_async_database_session
+
 # Define the router for binding the routes to the main FastAPI app
 router = APIRouter()
 
+# The media type of the streamed OpenAI responses, which the clients opt into with the Accept header
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+# The preference (RFC 7240) of the clients which don't wait for the OpenAI responses on their request
+RESPOND_ASYNC_PREFERENCE = "respond-async"
+
+
+def encode_server_sent_event(event: str, data: dict) -> bytes:
+    """
+    Encodes a server-sent event, with its data serialized as JSON.
+
+    :param event: The name of the event.
+    :param data: The data of the event.
+    :return: The encoded event.
+    """
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def stream_openai_response(
+        openai_responder: OpenAI_Responder,
+        question: str,
+        collection_version: Optional[int]
+    ) -> AsyncIterator[bytes]:
+    """
+    Streams the OpenAI response to a question as server-sent events: a `meta` event with the response's source,
+    an `answer` event for every generated part of the answer, then a `done` event.
+    Once the whole answer is generated, it is cached and queued to be added to the database, like a regular response.
+
+    :param openai_responder: The OpenAI responder service.
+    :param question: The question to respond to.
+    :param collection_version: The version of the FAQ collection when the question was asked, the response is cached under it.
+    :return: An async iterator over the encoded events.
+    """
+    yield encode_server_sent_event("meta", {"source": "openai", "matched_question": "N/A"})
+
+    answer_parts = []
+
+    try:
+        async for answer_part in openai_responder.astream_response(question):
+            answer_parts.append(answer_part)
+
+            yield encode_server_sent_event("answer", {"delta": answer_part})
+
+    except Exception as stream_excep:
+        # The response has already started, so the error can only be reported as an event
+        logging.error("Error while streaming the OpenAI response in ask-question route: %s", stream_excep)
+
+        yield encode_server_sent_event("error", {"detail": "Failed to generate the answer!"})
+        return
+
+    yield encode_server_sent_event("done", {})
+
+    response_data = QuestionResponse(
+        source="openai",
+        matched_question="N/A",
+        answer="".join(answer_parts)
+    )
+
+    await responses_cache.aset(question, faq_collection_name, collection_version, response_data.model_dump())
+
+    # Add the new embedding to the database, batched with the other requests' additions
+    await add_embeddings_queue.put((question, response_data.answer, faq_collection_name))
+
 
 @router.get("/question-page", response_class=HTMLResponse)
 async def ask_question_page(request: Request) -> HTMLResponse:
@@ -54,14 +135,14 @@ async def ask_question_page(request: Request) -> HTMLResponse:
     Renders the GET request for the question page.
 
     :param request: The request object.
-    :return: The rendered HTML template for the question page.
+    :return: The pre-rendered HTML of the question page.
     """
     try:
-        logging.info("Rendering question page")
-        return templates.TemplateResponse("question.html", {"request": request})
+        logging.info("Serving question page")
+        return HTMLResponse(content=render_static_page("question.html"))
     
     except Exception as question_render_excep:
-        logging.error(f"Error rendering question page: {question_render_excep}")
+        logging.error("Error rendering question page: %s", question_render_excep)
         raise HTTPException(status_code=500, detail="Error loading the question page")
 
 
@@ -70,7 +151,7 @@ async def ask_question(
     request: Request,
     user_question: Question,
     token: TokenData = Depends(get_token),
-    database_session: Session = Depends(get_database_session),
+    database_session: Union[Session, AsyncSession] = Depends(get_search_database_session),
     openai_responder: OpenAI_Responder = Depends(get_openai_responder),
     ):
     """
@@ -79,74 +160,139 @@ async def ask_question(
     :param request: The request object.
     :param user_question: The question provided by the user.
     :param token: The token data for authentication.
-    :param database_session: The database SQLAlchemy session.
+    :param database_session: The database SQLAlchemy session of the similarity search,
+        synchronous for the in-memory search and asyncio for the HNSW index search.
     :param openai_responder: The OpenAI responder service.
-    :return: The response data containing the matched question and answer.
+    :return: The response data containing the matched question and answer,
+        or, for clients accepting `text/event-stream`, the OpenAI response streamed as server-sent events,
+        or, for clients preferring `respond-async`, a 202 response whose answer is the ID of the task generating it.
     """
     if not user_question:
         logging.error("No user question provided")
-        return HTTPException(status_code=400, detail="No question provided")
+        raise HTTPException(status_code=400, detail="No question provided")
 
     try:
         user_question_str_representation = user_question.user_question
 
-        # Retrieve the initial collection name
-        faq_collection_name = get_faq_collection_name()
-        logging.info(f"FAQ collection name: {faq_collection_name}")
+        # The responses are cached per version of the collection, read before the search so a response is never cached
+        # under a version newer than the data it was built from
+        collection_version = await collection_versions.aget(faq_collection_name)
 
-        # Get an embedding of the user's question
-        question_embedding = embeddings_service.compute_embedding(user_question_str_representation)
-        logging.info(f"Question embedding computed with dimension {len(question_embedding)}")
+        # Answer a question asked recently (since the collection last changed) straight from the responses cache
+        cached_response = await responses_cache.aget(user_question_str_representation, faq_collection_name, collection_version)
 
-        # Perform similarity search in the database using the pgvector extension
-        most_similar_embedding, similarity_score = search_for_similarity_in_db(
-            database_session,
-            question_embedding, 
-            faq_collection_name
-        )
+        if cached_response is not None:
+            logging.info("Response to '%s' found in cache.", user_question_str_representation)
+            return QuestionResponse(**cached_response)
 
-        if most_similar_embedding:
-            # Check to see if the similarity is at least equal to the threshold
-            if similarity_score >= similarity_threshold:
-                logging.info("Similar content found, using the local FAQ database...")
+        # Get an embedding of the user's question, batched with the questions asked concurrently into a single OpenAI request
+        question_embedding = await query_embeddings_batcher.submit(user_question_str_representation)
+        logging.info("Question embedding computed with dimension %s", len(question_embedding))
 
-                # Create the required response structure and return it
-                response_data = QuestionResponse(
-                    source="local",
-                    matched_question=most_similar_embedding.content,
-                    answer=most_similar_embedding.answer
-                )
+        # Whether the client accepts the OpenAI response as a stream of server-sent events
+        stream_response = EVENT_STREAM_MEDIA_TYPE in request.headers.get("Accept", "")
+
+        # Whether the client retrieves the OpenAI response later, from the stream of the task generating it
+        respond_async = RESPOND_ASYNC_PREFERENCE in request.headers.get("Prefer", "")
+
+        # Optionally, speculatively start the OpenAI fallback, so a miss doesn't wait for the search before asking it
+        openai_response_task = asyncio.ensure_future(
+            openai_responder.aget_response(user_question_str_representation)
+        ) if speculative_openai_responses and not stream_response and not respond_async else None
 
-                # Update the matched embedding for faster retrieval next time
-                update_embeddings_in_db.delay( 
-                    [(
-                        most_similar_embedding.content, 
-                        most_similar_embedding.answer, 
-                        faq_collection_name
-                    )]
+        try:
+            # Perform similarity search, in the cached collection matrix or in the database using the pgvector extension
+            if similarity_search_in_memory:
+                # The matrix is loaded with the synchronous database driver, so the search runs in the threadpool
+                most_similar_embedding, similarity_score = await run_in_threadpool(
+                    search_for_similarity_in_memory,
+                    database_session,
+                    question_embedding, 
+                    faq_collection_name
                 )
 
             else:
-                logging.info(f"Content similar to '{user_question_str_representation}' not found, using the OpenAI responder...")
+                # The database query is awaited, so the event loop serves other requests meanwhile
+                most_similar_embedding, similarity_score = await search_for_similarity_in_db(
+                    database_session,
+                    question_embedding,
+                    faq_collection_name
+                )
+
+        except BaseException:
+            if openai_response_task is not None:
+                openai_response_task.cancel()
+
+            raise
+
+        # Use the local FAQ database if the most similar content is at least as similar as the threshold
+        # Otherwise (including an empty collection), fall back to the OpenAI responder
+        if most_similar_embedding is not None and similarity_score >= similarity_threshold:
+            logging.info("Similar content found, using the local FAQ database...")
 
-                # If the similarity is below the threshold, return the OpenAI response
-                openai_response = openai_responder.get_response(user_question_str_representation)
+            # The speculative OpenAI response isn't needed anymore
+            if openai_response_task is not None:
+                openai_response_task.cancel()
 
-                response_data = QuestionResponse(
-                    source="openai",
-                    matched_question="N/A",
-                    answer=openai_response
+            # Create the required response structure and return it
+            response_data = QuestionResponse(
+                source="local",
+                matched_question=most_similar_embedding.content,
+                answer=most_similar_embedding.answer
+            )
+
+        else:
+            logging.info("Content similar to '%s' not found, using the OpenAI responder...", user_question_str_representation)
+
+            # Generate the answer in a Celery task, the client reads it from the task's stream
+            # Publishing to the broker is blocking, so it runs in the threadpool
+            if respond_async:
+                answer_task = await run_in_threadpool(
+                    generate_openai_answer.delay,
+                    user_question_str_representation,
+                    faq_collection_name
                 )
-        
-                # Add the new embedding to the database
-                # Using the multiple embeddings adding method in case the prompt is too large
-                add_embeddings_to_db.delay( 
-                    [(
-                        user_question_str_representation, 
-                        openai_response, 
-                        faq_collection_name
-                    )]
+
+                return ORJSONResponse(
+                    status_code=202,
+                    content=QuestionResponse(source="pending", matched_question="N/A", answer=answer_task.id).model_dump(),
+                    headers={"Location": f"/ask-question/stream/{answer_task.id}", "Preference-Applied": RESPOND_ASYNC_PREFERENCE}
                 )
+
+            # Stream the answer as it is generated, so the client doesn't wait for the whole completion
+            if stream_response:
+                return StreamingResponse(
+                    stream_openai_response(openai_responder, user_question_str_representation, collection_version),
+                    media_type=EVENT_STREAM_MEDIA_TYPE
+                )
+
+            # If the similarity is below the threshold, return the OpenAI response (the speculative one, if it was started)
+            if openai_response_task is not None:
+                openai_response = await openai_response_task
+
+            else:
+                openai_response = await openai_responder.aget_response(user_question_str_representation)
+
+            response_data = QuestionResponse(
+                source="openai",
+                matched_question="N/A",
+                answer=openai_response
+            )
+    
+            # Add the new embedding to the database, batched with the other requests' additions
+            # Using the multiple embeddings adding method in case the prompt is too large
+            await add_embeddings_queue.put((
+                user_question_str_representation, 
+                openai_response, 
+                faq_collection_name
+            ))
+
+        await responses_cache.aset(
+            user_question_str_representation,
+            faq_collection_name,
+            collection_version,
+            response_data.model_dump()
+        )
         
         return response_data
     
@@ -154,21 +300,40 @@ async def ask_question(
     # The embedding adding and update methods already catch SPECIFIC exceptions
     # Here I just add an extra layer of error handling
     except SQLAlchemyError as database_excep:
-        logging.error(f"Database error in ask-question route: {database_excep}")
+        logging.error("Database error in ask-question route: %s", database_excep)
         raise HTTPException(status_code=500, detail="Database error occurred while processing the question")
     
     except EmbeddingComputationError as embed_excep:
-        logging.error(f"Embedding computation error in ask-question route: {embed_excep}")
+        logging.error("Embedding computation error in ask-question route: %s", embed_excep)
         raise HTTPException(status_code=500, detail=str(embed_excep))
 
-    except RequestException as api_excep:
-        logging.error(f"OpenAI API request failed in ask-question route: {api_excep}")
+    except HTTPError as api_excep:
+        logging.error("OpenAI API request failed in ask-question route: %s", api_excep)
         raise HTTPException(status_code=502, detail="Failed to connect to external API!")
 
     except ValueError as value_excep:
-        logging.error(f"Value error while processing the question in ask-question route: {value_excep}")
+        logging.error("Value error while processing the question in ask-question route: %s", value_excep)
         raise HTTPException(status_code=400, detail="Invalid input or value error!")
 
     except Exception as http_excep:
-        logging.error(f"Unhandled exception in ask-question route: {http_excep}")
+        logging.error("Unhandled exception in ask-question route: %s", http_excep)
         raise HTTPException(status_code=500, detail="Internal server error!")
+
+
+@router.get("/ask-question/stream/{task_id}")
+async def stream_answer(task_id: str, token: TokenData = Depends(get_token)) -> StreamingResponse:
+    """
+    Streams the answer generated by a background task as server-sent events, with the same events as the
+    streamed OpenAI responses of the ask-question route. The events already published are replayed first.
+
+    :param task_id: The ID of the task generating the answer, returned by the ask-question route.
+    :param token: The token data for authentication.
+    :return: The answer's events, streamed as they are published.
+    """
+    logging.info("Streaming the answer of task '%s'...", task_id)
+
+    async def stream_answer_events() -> AsyncIterator[bytes]:
+        async for event, data in read_answer_events(task_id):
+            yield encode_server_sent_event(event, data)
+
+    return StreamingResponse(stream_answer_events(), media_type=EVENT_STREAM_MEDIA_TYPE)
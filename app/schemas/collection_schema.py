@@ -1,12 +1,27 @@
 # Package imports
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from typing_extensions import Annotated
 
 
 """
-This module defines the Collection Pydantic model, which is used by the FastAPI endpoint
+This module defines the Collection Pydantic model, which is used by the FastAPI endpoint,
+    the CollectionRequest model, the collection sent in the create and update requests,
+    and the PaginatedCollections model, a page of collections with the cursor of the next page.
+
+The requested collection names are validated against a pattern (compiled once by Pydantic), so invalid names are rejected
+before any database round trip. The responses keep plain names, so the collections already stored are always returned.
 """
 
 
+# The characters allowed in a collection name, and its maximum length (the size of the collection columns)
+COLLECTION_NAME_PATTERN = r"^[A-Za-z0-9_\-]+$"
+COLLECTION_NAME_MAX_LENGTH = 255
+
+# A validated collection name
+CollectionName = Annotated[str, Field(min_length=1, max_length=COLLECTION_NAME_MAX_LENGTH, pattern=COLLECTION_NAME_PATTERN)]
+
+
 class Collection(BaseModel):
     """
     The collection class used by the FastAPI endpoint.
@@ -15,3 +30,19 @@ class Collection(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class CollectionRequest(Collection):
+    """
+    The collection sent in the create and update requests, whose name is validated.
+    """
+    name: CollectionName
+
+
+class PaginatedCollections(BaseModel):
+    """
+    A page of collections, ordered by name.
+    The next cursor is the name of the last collection of the page, or None if this is the last page.
+    """
+    items: List[Collection]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,147 @@
+import logging
+import orjson
+import redis
+import redis.asyncio
+
+# Package imports
+from typing import AsyncIterator, Tuple
+
+# Local files imports
+from core.celery_app import celery
+from core.config import get_settings
+from database.manage_database import add_embeddings_to_db, collection_versions, responses_cache
+from schemas.question_schema import QuestionResponse
+from utils.utils import get_openai_responder
+
+
+"""
+This module generates the OpenAI answers in the background, for the clients which don't wait for them on their request.
+
+generate_openai_answer: Celery task streaming the answer to a question into a Redis stream, event by event,
+    then caching it and adding it to the database, like a regular response.
+
+read_answer_events: Reads the events of an answer's Redis stream, from its start, waiting for the ones not generated yet.
+    The stream is kept for a few minutes, so a client may start reading it before or after the answer is generated.
+"""
+
+
+# Set the logging config
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Retrieve the environment variables as settings
+settings = get_settings()
+
+# The number of seconds an answer's stream is kept after its last event
+ANSWER_STREAM_TTL = 300
+
+# The number of milliseconds a reader waits for the next event of an answer before giving up
+ANSWER_STREAM_BLOCK_MS = 30000
+
+# The events ending an answer's stream
+ANSWER_STREAM_END_EVENTS = ("done", "error")
+
+# The Redis clients of the answers' streams, the Celery workers write with the blocking one and the routes read with the asyncio one
+redis_client = redis.Redis.from_url(settings.redis_cache_url)
+async_redis_client = redis.asyncio.Redis.from_url(settings.redis_cache_url)
+
+
+def get_answer_stream_key(task_id: str) -> str:
+    """
+    Builds the Redis key of the stream of an answer.
+
+    :param task_id: The ID of the task generating the answer.
+    :return: The Redis key of the answer's stream.
+    """
+    return f"answer:{task_id}"
+
+
+def publish_answer_event(stream_key: str, event: str, data: dict) -> None:
+    """
+    Appends an event to an answer's stream, renewing the stream's expiration.
+
+    :param stream_key: The Redis key of the answer's stream.
+    :param event: The name of the event.
+    :param data: The data of the event.
+    :return: None
+    """
+    with redis_client.pipeline() as pipe:
+        pipe.xadd(stream_key, {"event": event, "data": orjson.dumps(data)})
+        pipe.expire(stream_key, ANSWER_STREAM_TTL)
+        pipe.execute()
+
+
+@celery.task(bind=True)
+def generate_openai_answer(self, question: str, collection: str) -> None:
+    """
+    Generates the OpenAI answer to a question, publishing it to the task's Redis stream as it is generated:
+    a `meta` event with the response's source, an `answer` event for every generated part of the answer, then a `done` event.
+    Once the whole answer is generated, it is cached and added to the database, like a regular response.
+
+    :param self: The Celery task instance.
+    :param question: The question to answer.
+    :param collection: The collection the question and its answer are added to.
+    :return: None
+    """
+    stream_key = get_answer_stream_key(self.request.id)
+
+    # The answer is cached under the collection's version read before it is generated, like in the ask-question route
+    collection_version = collection_versions.get(collection)
+
+    publish_answer_event(stream_key, "meta", {"source": "openai", "matched_question": "N/A"})
+
+    answer_parts = []
+
+    try:
+        for answer_part in get_openai_responder().stream_response(question):
+            answer_parts.append(answer_part)
+
+            publish_answer_event(stream_key, "answer", {"delta": answer_part})
+
+    except Exception as generation_excep:
+        logging.error(f"Error while generating the answer to '{question}': {generation_excep}")
+
+        publish_answer_event(stream_key, "error", {"detail": "Failed to generate the answer!"})
+        return
+
+    publish_answer_event(stream_key, "done", {})
+
+    response_data = QuestionResponse(
+        source="openai",
+        matched_question="N/A",
+        answer="".join(answer_parts)
+    )
+
+    responses_cache.set(question, collection, collection_version, response_data.model_dump())
+
+    # Add the new embedding within this task, instead of publishing another task to the broker
+    add_embeddings_to_db([(question, response_data.answer, collection)])
+
+
+async def read_answer_events(task_id: str) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Reads the events of an answer's stream from its start, until its `done` or `error` event.
+    An `error` event is returned if no event is published for too long.
+
+    :param task_id: The ID of the task generating the answer.
+    :return: An async iterator over the names and data of the answer's events.
+    """
+    stream_key = get_answer_stream_key(task_id)
+    last_event_id = "0"
+
+    while True:
+        entries = await async_redis_client.xread({stream_key: last_event_id}, count=100, block=ANSWER_STREAM_BLOCK_MS)
+
+        if not entries:
+            logging.warning(f"Timed out waiting for the answer of task '{task_id}'.")
+
+            yield "error", {"detail": "Timed out waiting for the answer!"}
+            return
+
+        for event_id, fields in entries[0][1]:
+            last_event_id = event_id
+            event = fields[b"event"].decode("utf-8")
+
+            yield event, orjson.loads(fields[b"data"])
+
+            if event in ANSWER_STREAM_END_EVENTS:
+                return
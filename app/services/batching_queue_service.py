@@ -0,0 +1,116 @@
+import logging
+import asyncio
+
+# Package imports
+from abc import ABC, abstractmethod
+from typing import Any, List
+
+
+"""
+This module implements the BatchingQueue class, the base of the queues which gather the items sent concurrently
+    by the routes into batches, handled at once instead of one by one.
+
+A batch is handled once it holds enough items or its oldest item waited long enough.
+The subclasses only define how a batch is handled: BatchedTaskQueue sends it to a Celery task,
+    and EmbeddingsBatcher embeds it with a single OpenAI request.
+"""
+
+
+# Set the logging config
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class BatchingQueue(ABC):
+    """
+    Base class for the queues handling their items in batches, gathered by a worker running in the event loop.
+    This class is not meant to be instantiated directly.
+    """
+    def __init__(self, max_batch_size: int, batch_window: float) -> None:
+        """
+        Initializes the queue. The asyncio queue and its worker are only created by start, within the running event loop.
+
+        :param max_batch_size: The maximum number of items handled in one batch.
+        :param batch_window: The maximum number of seconds an item waits for its batch to be handled.
+        :return: None
+        """
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+
+        self.queue = None
+        self.worker = None
+
+
+    async def start(self) -> None:
+        """
+        Creates the asyncio queue and starts the worker batching it.
+
+        :return: None
+        """
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.ensure_future(self.run())
+
+
+    async def run(self) -> None:
+        """
+        Gathers the queued items into batches and handles them, until the stop sentinel (None) is received.
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self.queue.get()
+
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = loop.time() + self.batch_window
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+
+                if timeout <= 0:
+                    break
+
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+
+                except asyncio.TimeoutError:
+                    break
+
+                if item is None:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            await self.handle_batch(batch)
+
+
+    @abstractmethod
+    async def handle_batch(self, batch: List[Any]) -> None:
+        """
+        Handles a batch of queued items.
+
+        :param batch: The items of the batch.
+        :return: None
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+    async def stop(self) -> None:
+        """
+        Stops the worker, once it has handled the items still queued.
+
+        :return: None
+        """
+        if self.worker is None:
+            return
+
+        await self.queue.put(None)
+        await self.worker
+
+        self.queue = None
+        self.worker = None
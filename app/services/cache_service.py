@@ -0,0 +1,417 @@
+import logging
+import hashlib
+import threading
+import numpy as np
+import redis
+import redis.asyncio
+import orjson
+
+# Package imports
+from collections import OrderedDict
+from typing import Optional
+
+# Local files imports
+from core.config import get_settings
+
+
+"""
+This module implements the EmbeddingsCache class, a two-tier cache for embeddings, the VersionCounter class,
+    shared version counters, and the ResponsesCache class, a Redis cache for the final responses to questions.
+
+The first tier is a bounded, process-local LRU, which answers repeated lookups without any I/O or copy,
+    handing out read-only arrays so the cached embeddings can't be modified by the callers.
+The second tier is Redis, shared by the app and the Celery workers, which stores the embeddings as raw float32 bytes.
+
+Redis is only an optimization: if it can't be reached, the cache logs the error and behaves like a miss.
+The async methods go through an asyncio Redis client, so the routes can use the cache without blocking the event loop.
+
+The version counters are kept in Redis too, and let every process tell when its local copy of a collection is stale.
+"""
+
+
+# Set the logging config
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Retrieve the environment variables as settings
+settings = get_settings()
+
+
+class EmbeddingsCache:
+    """
+    Two-tier cache for embeddings: a process-local LRU in front of a shared Redis cache.
+    The entries are keyed by a tuple of strings, hashed into the Redis key.
+    """
+    def __init__(self, namespace: str, max_size: Optional[int] = None, ttl: Optional[int] = None) -> None:
+        """
+        Initializes the cache and its Redis client. The Redis connection is only opened on first use.
+
+        :param namespace: The prefix of the Redis keys, which separates this cache from others.
+        :param max_size: The maximum number of entries kept in the local LRU, defaults to the cache size setting.
+        :param ttl: Optional, the number of seconds the entries are kept in Redis.
+        :return: None
+        """
+        self.namespace = namespace
+        self.max_size = max_size if max_size is not None else int(settings.embeddings_cache_size)
+        self.ttl = ttl
+
+        self.local_cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.redis_client = redis.Redis.from_url(settings.redis_cache_url)
+        self.async_redis_client = redis.asyncio.Redis.from_url(settings.redis_cache_url)
+
+
+    def make_key(self, *key_parts: str) -> str:
+        """
+        Builds the Redis key of an entry, hashing its parts into a 16-byte digest so every key has the same short size.
+
+        :param key_parts: The strings identifying the entry.
+        :return: The Redis key of the entry.
+        """
+        digest = hashlib.blake2b("\x1f".join(key_parts).encode("utf-8"), digest_size=16).hexdigest()
+
+        return f"{self.namespace}:{digest}"
+
+
+    def get(self, *key_parts: str) -> Optional[np.ndarray]:
+        """
+        Retrieves an embedding from the local LRU, then from Redis, promoting Redis hits to the local LRU.
+
+        :param key_parts: The strings identifying the entry.
+        :return: The cached embedding as a float32 array, or None on a miss.
+        """
+        key = self.make_key(*key_parts)
+
+        with self.lock:
+            if key in self.local_cache:
+                self.local_cache.move_to_end(key)
+
+                return self.local_cache[key]
+
+        try:
+            cached_bytes = self.redis_client.get(key)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not read '{key}' from the Redis cache: {redis_excep}")
+            return None
+
+        if cached_bytes is None:
+            return None
+
+        embedding = np.frombuffer(cached_bytes, dtype=np.float32)
+        self.set_local(key, embedding)
+
+        return embedding
+
+
+    async def aget(self, *key_parts: str) -> Optional[np.ndarray]:
+        """
+        Asynchronously retrieves an embedding from the local LRU, then from Redis, promoting Redis hits to the local LRU.
+
+        :param key_parts: The strings identifying the entry.
+        :return: The cached embedding as a float32 array, or None on a miss.
+        """
+        key = self.make_key(*key_parts)
+
+        with self.lock:
+            if key in self.local_cache:
+                self.local_cache.move_to_end(key)
+
+                return self.local_cache[key]
+
+        try:
+            cached_bytes = await self.async_redis_client.get(key)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not read '{key}' from the Redis cache: {redis_excep}")
+            return None
+
+        if cached_bytes is None:
+            return None
+
+        embedding = np.frombuffer(cached_bytes, dtype=np.float32)
+        self.set_local(key, embedding)
+
+        return embedding
+
+
+    def set(self, embedding: np.ndarray, *key_parts: str) -> None:
+        """
+        Stores an embedding in both cache tiers.
+
+        :param embedding: The embedding to store.
+        :param key_parts: The strings identifying the entry.
+        :return: None
+        """
+        key = self.make_key(*key_parts)
+        embedding = self.as_read_only(embedding)
+
+        self.set_local(key, embedding)
+
+        try:
+            self.redis_client.set(key, embedding.tobytes(), ex=self.ttl)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not write '{key}' to the Redis cache: {redis_excep}")
+
+
+    async def aset(self, embedding: np.ndarray, *key_parts: str) -> None:
+        """
+        Asynchronously stores an embedding in both cache tiers.
+
+        :param embedding: The embedding to store.
+        :param key_parts: The strings identifying the entry.
+        :return: None
+        """
+        key = self.make_key(*key_parts)
+        embedding = self.as_read_only(embedding)
+
+        self.set_local(key, embedding)
+
+        try:
+            await self.async_redis_client.set(key, embedding.tobytes(), ex=self.ttl)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not write '{key}' to the Redis cache: {redis_excep}")
+
+
+    @staticmethod
+    def as_read_only(embedding: np.ndarray) -> np.ndarray:
+        """
+        Returns a read-only float32 view of an embedding, without copying it when it already is float32.
+        The local LRU hands its entries out directly, so they must not be modified by whoever retrieves them.
+
+        :param embedding: The embedding to view.
+        :return: The read-only float32 view of the embedding.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).view()
+        embedding.flags.writeable = False
+
+        return embedding
+
+
+    def set_local(self, key: str, embedding: np.ndarray) -> None:
+        """
+        Stores an embedding in the local LRU, evicting the least recently used entry if it is full.
+
+        :param key: The key of the entry.
+        :param embedding: The embedding to store.
+        :return: None
+        """
+        with self.lock:
+            self.local_cache[key] = embedding
+            self.local_cache.move_to_end(key)
+
+            if len(self.local_cache) > self.max_size:
+                self.local_cache.popitem(last=False)
+
+
+    def delete(self, *key_parts: str) -> None:
+        """
+        Removes an embedding from both cache tiers.
+
+        :param key_parts: The strings identifying the entry.
+        :return: None
+        """
+        key = self.make_key(*key_parts)
+
+        with self.lock:
+            self.local_cache.pop(key, None)
+
+        try:
+            self.redis_client.delete(key)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not delete '{key}' from the Redis cache: {redis_excep}")
+
+
+    def clear_local(self) -> None:
+        """
+        Clears the local LRU, leaving the shared Redis entries untouched.
+        """
+        logging.info(f"Clearing the local '{self.namespace}' embeddings cache...")
+
+        with self.lock:
+            self.local_cache.clear()
+
+
+class VersionCounter:
+    """
+    Shared version counters kept in Redis, bumped on every change of the data they refer to,
+    which let every process tell when its local copy of that data is stale.
+    """
+    def __init__(self, namespace: str) -> None:
+        """
+        Initializes the counters and their Redis client. The Redis connection is only opened on first use.
+
+        :param namespace: The prefix of the Redis keys, which separates these counters from others.
+        :return: None
+        """
+        self.namespace = namespace
+
+        self.redis_client = redis.Redis.from_url(settings.redis_cache_url)
+        self.async_redis_client = redis.asyncio.Redis.from_url(settings.redis_cache_url)
+
+
+    def get(self, name: str) -> Optional[int]:
+        """
+        Retrieves the version counter of a name.
+
+        :param name: The name whose version to retrieve.
+        :return: The current version (0 if it was never bumped), or None if Redis can't be reached.
+        """
+        key = f"{self.namespace}:{name}"
+
+        try:
+            version = self.redis_client.get(key)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not read '{key}' from the Redis cache: {redis_excep}")
+            return None
+
+        return int(version) if version is not None else 0
+
+
+    async def aget(self, name: str) -> Optional[int]:
+        """
+        Asynchronously retrieves the version counter of a name.
+
+        :param name: The name whose version to retrieve.
+        :return: The current version (0 if it was never bumped), or None if Redis can't be reached.
+        """
+        key = f"{self.namespace}:{name}"
+
+        try:
+            version = await self.async_redis_client.get(key)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not read '{key}' from the Redis cache: {redis_excep}")
+            return None
+
+        return int(version) if version is not None else 0
+
+
+    def bump(self, name: str) -> None:
+        """
+        Increments the version counter of a name, so the local copies of its data are reloaded.
+
+        :param name: The name whose version to bump.
+        :return: None
+        """
+        key = f"{self.namespace}:{name}"
+
+        try:
+            self.redis_client.incr(key)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not bump '{key}' in the Redis cache: {redis_excep}")
+
+
+class ResponsesCache:
+    """
+    Redis cache of the final responses to questions, keyed by the normalized question text and by the collection
+    the question was answered from, at its version when the question was asked.
+    So every change of the collection makes its cached responses stale, whichever process made it.
+    The responses are stored as orjson-serialized dictionaries, and expire after a TTL.
+    Without a known version (Redis can't be reached), the responses are neither retrieved nor stored.
+    """
+    def __init__(self, namespace: str, ttl: Optional[int] = None) -> None:
+        """
+        Initializes the cache and its Redis clients. The Redis connections are only opened on first use.
+        The routes use the asyncio client, while the Celery workers store their responses with the blocking one.
+
+        :param namespace: The prefix of the Redis keys, which separates this cache from others.
+        :param ttl: Optional, the number of seconds the responses are kept, defaults to the responses cache TTL setting.
+        :return: None
+        """
+        self.namespace = namespace
+        self.ttl = ttl if ttl is not None else int(settings.responses_cache_ttl)
+
+        self.redis_client = redis.Redis.from_url(settings.redis_cache_url)
+        self.async_redis_client = redis.asyncio.Redis.from_url(settings.redis_cache_url)
+
+
+    def make_key(self, question: str, collection: str, version: int) -> str:
+        """
+        Builds the Redis key of a question, so questions differing only by case or whitespace share their response.
+
+        :param question: The question to build the key for.
+        :param collection: The collection the question is answered from.
+        :param version: The version of the collection.
+        :return: The Redis key of the question.
+        """
+        normalized_question = " ".join(question.lower().split())
+        digest = hashlib.sha256(f"{collection}\x1f{version}\x1f{normalized_question}".encode("utf-8")).hexdigest()
+
+        return f"{self.namespace}:{digest}"
+
+
+    async def aget(self, question: str, collection: str, version: Optional[int]) -> Optional[dict]:
+        """
+        Asynchronously retrieves the cached response to a question.
+
+        :param question: The question whose response to retrieve.
+        :param collection: The collection the question is answered from.
+        :param version: The version of the collection, or None if it is unknown.
+        :return: The cached response, or None on a miss.
+        """
+        if version is None:
+            return None
+
+        key = self.make_key(question, collection, version)
+
+        try:
+            cached_bytes = await self.async_redis_client.get(key)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not read '{key}' from the Redis cache: {redis_excep}")
+            return None
+
+        if cached_bytes is None:
+            return None
+
+        return orjson.loads(cached_bytes)
+
+
+    def set(self, question: str, collection: str, version: Optional[int], response: dict) -> None:
+        """
+        Stores the response to a question.
+
+        :param question: The question the response answers.
+        :param collection: The collection the question is answered from.
+        :param version: The version of the collection when the question was asked, or None if it is unknown.
+        :param response: The response to store.
+        :return: None
+        """
+        if version is None:
+            return
+
+        key = self.make_key(question, collection, version)
+
+        try:
+            self.redis_client.set(key, orjson.dumps(response), ex=self.ttl)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not write '{key}' to the Redis cache: {redis_excep}")
+
+
+    async def aset(self, question: str, collection: str, version: Optional[int], response: dict) -> None:
+        """
+        Asynchronously stores the response to a question.
+
+        :param question: The question the response answers.
+        :param collection: The collection the question is answered from.
+        :param version: The version of the collection when the question was asked, or None if it is unknown.
+        :param response: The response to store.
+        :return: None
+        """
+        if version is None:
+            return
+
+        key = self.make_key(question, collection, version)
+
+        try:
+            await self.async_redis_client.set(key, orjson.dumps(response), ex=self.ttl)
+
+        except redis.RedisError as redis_excep:
+            logging.warning(f"Could not write '{key}' to the Redis cache: {redis_excep}")
@@ -0,0 +1,138 @@
+import logging
+import asyncio
+import numpy as np
+
+# Package imports
+from typing import List, Optional, Set, Tuple
+
+# Local files imports
+from core.config import get_settings
+from services.batching_queue_service import BatchingQueue
+from services.embeddings_service import OpenAIEmbeddingsService
+
+
+"""
+This module implements the EmbeddingsBatcher class, which gathers the questions' embeddings requested concurrently
+    by the routes and computes them with a single OpenAI request, instead of a request per question.
+
+query_embeddings_batcher batches the embeddings of the asked questions.
+It is started and stopped by the application's lifespan.
+"""
+
+
+# Set the logging config
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Retrieve the environment variables as settings
+settings = get_settings()
+
+# Get a singleton instance of the OpenAI embeddings model
+embeddings_service = OpenAIEmbeddingsService()
+
+
+class EmbeddingsBatcher(BatchingQueue):
+    """
+    Queue of the texts to embed, computed as a single request once it holds enough texts or its oldest text waited long enough.
+    The cached embeddings are returned right away, without being queued.
+    """
+    def __init__(self, max_batch_size: Optional[int] = None, batch_window: Optional[float] = None) -> None:
+        """
+        Initializes the batcher. The asyncio queue and its worker are only created by start, within the running event loop.
+
+        :param max_batch_size: The maximum number of texts embedded in one request, defaults to the query embeddings batch size setting.
+        :param batch_window: The maximum number of seconds a text waits, defaults to the query embeddings batch window setting.
+        :return: None
+        """
+        super().__init__(
+            max_batch_size=max_batch_size if max_batch_size is not None else int(settings.query_embeddings_batch_size),
+            batch_window=batch_window if batch_window is not None else int(settings.query_embeddings_batch_window_ms) / 1000
+        )
+
+        self.pending_requests: Set[asyncio.Future] = set()
+
+
+    async def submit(self, text: str) -> np.ndarray:
+        """
+        Computes the embedding of a text, batched with the texts submitted within the same window.
+        It is computed on its own if the batcher isn't running.
+
+        :param text: The text to compute the embedding for.
+        :return: The embedding for the given text, as a float32 array.
+        """
+        if self.worker is None:
+            return await embeddings_service.acompute_embedding(text)
+
+        cached_embedding = await embeddings_service.cache.aget(text)
+
+        if cached_embedding is not None:
+            logging.info(f"Embedding for text {text} found in cache.")
+
+            return cached_embedding
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+
+        return await future
+
+
+    async def handle_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """
+        Embeds a batch of texts in its own task, so the next batch is gathered while the request is in flight.
+
+        :param batch: The texts to embed, with the futures awaited by their requesters.
+        :return: None
+        """
+        request = asyncio.ensure_future(self.embed(batch))
+
+        self.pending_requests.add(request)
+        request.add_done_callback(self.pending_requests.discard)
+
+
+    async def embed(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """
+        Embeds a batch of texts with a single request, then resolves the future of each text with its embedding.
+
+        :param batch: The texts to embed, with the futures awaited by their requesters.
+        :return: None
+        """
+        # Identical texts are only embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+
+        try:
+            embeddings = await embeddings_service.acompute_batch_embeddings(texts)
+
+        except Exception as batch_excep:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(batch_excep)
+
+            return
+
+        logging.info(f"Computed the embeddings of {len(texts)} text(s) with a single request.")
+
+        text_embeddings = dict(zip(texts, embeddings))
+
+        for text, future in batch:
+            # The requester may have been cancelled, e.g. by a client disconnecting, while the batch was embedded
+            if not future.done():
+                future.set_result(text_embeddings[text])
+
+        # Save them for future usage, keyed by the texts as they were requested
+        for text, embedding in text_embeddings.items():
+            await embeddings_service.cache.aset(embedding, text)
+
+
+    async def stop(self) -> None:
+        """
+        Stops the worker, once it has embedded the texts still queued, and waits for the requests in flight.
+
+        :return: None
+        """
+        await super().stop()
+
+        if self.pending_requests:
+            await asyncio.gather(*self.pending_requests)
+
+
+# The batcher of the asked questions' embeddings
+query_embeddings_batcher = EmbeddingsBatcher()
@@ -1,14 +1,16 @@
 import logging
-import tiktoken
 import numpy as np
 
 # Package imports
 from abc import ABC, abstractmethod
-from typing import List
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
 from langchain_openai import OpenAIEmbeddings
 
 # Local files imports
 from core.config import get_settings
+from services.cache_service import EmbeddingsCache
 
 
 """
@@ -27,18 +29,40 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Retrieve the environment variables as settings
 settings = get_settings()
 
+# The maximum number of UTF-8 bytes of a character, every token being at least one byte long
+MAX_CHARACTER_BYTES = 4
+
+
+@lru_cache(maxsize=1)
+def get_token_encoding():
+    """
+    Helper method.
+    Loads the tokenizer of the embeddings models once, on first use instead of on every text.
+    tiktoken is only imported here, so the processes which never limit a long text don't pay for importing it,
+        nor for loading its BPE ranks.
+
+    :return: The cl100k_base tiktoken encoding.
+    """
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
 
 def limit_token_length(text: str, max_tokens: int = 2000) -> str:
     """
     Helper method.
     Limits the number of tokens in the given text to the specified maximum for token-efficient embedding generation.
     It uses the tiktoken encoding to count the tokens and truncates the text accordingly.
+    A text too short to possibly exceed the maximum is returned without being encoded.
 
     :param text: The text to limit the tokens for.
     :param max_tokens: The maximum number of tokens to keep.
     :return: The text with the limited number of tokens.
     """
-    encoding = tiktoken.get_encoding("cl100k_base")
+    if len(text) * MAX_CHARACTER_BYTES <= max_tokens:
+        return text
+
+    encoding = get_token_encoding()
     tokens = encoding.encode(text)
 
     if len(tokens) > max_tokens:
@@ -115,35 +139,55 @@ class OpenAIEmbeddingsService(EmbeddingsService):
                 logging.error("OPENAI_API_KEY environment variable is not set!")
                 raise EnvironmentError("OPENAI_API_KEY environment variable is not set!")
 
+            # The maximum number of texts sent in a single embeddings request
+            self.embeddings_request_size = int(settings.embeddings_request_size)
+
             # Catch errors that may occur during OpenAI embeddings model init
             try:
                 self.embeddings_model = OpenAIEmbeddings(
                     model=model,
-                    api_key=openai_api_key
+                    api_key=openai_api_key,
+                    chunk_size=self.embeddings_request_size
                 )
 
             except Exception as embeddings_excep:
                 logging.error(f"Error while initializing OpenAIEmbeddingsService: {embeddings_excep}")
                 raise embeddings_excep
-        
-        self.cache = {}
+
+            # Bounded pool of threads, shared by every concurrent batches computation, which caps the in-flight requests
+            self.executor = ThreadPoolExecutor(
+                max_workers=int(settings.embedding_workers),
+                thread_name_prefix="embeddings"
+            )
+
+            # Cache of the computed query embeddings, shared through Redis and partitioned by model,
+            # so switching the model never returns embeddings of another model
+            self.cache = EmbeddingsCache(
+                namespace=f"query_emb:{model}",
+                ttl=int(settings.query_embeddings_cache_ttl)
+            )
+
         self.initialized = True
 
 
-    def compute_embedding(self, text: str) -> list:
+    def compute_embedding(self, text: str) -> np.ndarray:
         """
         Computes the embedding for the given text.
-        It's cached to avoid recomputing the same embedding for the same text.
+        It's cached (locally and in Redis, for every process) to avoid recomputing the same embedding for the same text.
         It ensures that the text is limited to a maximum number of tokens before computing the embedding.
         
         :param text: The text to compute the embedding for.
-        :return: The embedding for the given text.
+        :return: The embedding for the given text, as a float32 array.
         """
-        if text in self.cache:
+        cached_embedding = self.cache.get(text)
+
+        if cached_embedding is not None:
             logging.info(f"Embedding for text {text} found in cache.")
 
-            return self.cache[text]
+            return cached_embedding
         
+        original_text = text
+
         # Ensure the text is not over a certain limit length
         text = limit_token_length(text)
 
@@ -157,33 +201,129 @@ class OpenAIEmbeddingsService(EmbeddingsService):
             logging.error(f"Error while computing embedding for text {text}: {embedding_excep}")
             raise EmbeddingComputationError(f"Failed to compute embedding for text: {text}") from embedding_excep
 
-        # Save it for future usage
-        self.cache[text] = text_embedding
+        text_embedding = np.asarray(text_embedding, dtype=np.float32)
+
+        # Save it for future usage, keyed by the text as it was requested
+        self.cache.set(text_embedding, original_text)
 
-        return np.array(
-            self.cache[text]
-        ).tolist()
+        return text_embedding
 
 
-    def compute_batch_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+    async def acompute_embedding(self, text: str) -> np.ndarray:
+        """
+        Asynchronously computes the embedding for the given text, with the same caching as compute_embedding.
+        Both the cache lookups and the OpenAI request are awaited, so the event loop keeps serving other requests meanwhile.
+
+        :param text: The text to compute the embedding for.
+        :return: The embedding for the given text, as a float32 array.
         """
-        Computes embeddings for a batch of texts.
+        cached_embedding = await self.cache.aget(text)
+
+        if cached_embedding is not None:
+            logging.info(f"Embedding for text {text} found in cache.")
+
+            return cached_embedding
+
+        original_text = text
+
+        # Ensure the text is not over a certain limit length
+        text = limit_token_length(text)
+
+        try:
+            logging.info(f"Computing embedding for text '{text}'...")
+
+            # Embed the text with the model's async client, if not found in the cache
+            text_embedding = await self.embeddings_model.aembed_query(text)
+
+        except Exception as embedding_excep:
+            logging.error(f"Error while computing embedding for text {text}: {embedding_excep}")
+            raise EmbeddingComputationError(f"Failed to compute embedding for text: {text}") from embedding_excep
+
+        text_embedding = np.asarray(text_embedding, dtype=np.float32)
+
+        # Save it for future usage, keyed by the text as it was requested
+        await self.cache.aset(text_embedding, original_text)
+
+        return text_embedding
+
+
+    def compute_batch_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Computes embeddings for a batch of texts, using a single request to the embeddings model.
+        It ensures that each text is limited to a maximum number of tokens before computing the embeddings.
 
         :param texts: The list of texts to compute embeddings for.
-        :return: A list of embeddings for the given texts.
+        :return: A (number of texts, embedding dimension) float32 array, with the embeddings in the same order as the texts.
         """
+        # Ensure the texts are not over a certain limit length
+        texts = [limit_token_length(text) for text in texts]
+
         try:
-            return [np.array(embedding) for embedding in self.embeddings_model.embed_documents(texts)]
+            return np.asarray(self.embeddings_model.embed_documents(texts), dtype=np.float32)
         
         except Exception as batch_embedding_excep:
             logging.error(f"Error while computing batch embeddings: {batch_embedding_excep}")
             raise EmbeddingComputationError("Failed to compute batch embeddings") from batch_embedding_excep
 
 
+    async def acompute_batch_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Asynchronously computes embeddings for a batch of texts, using a single request to the embeddings model.
+        It ensures that each text is limited to a maximum number of tokens before computing the embeddings.
+
+        :param texts: The list of texts to compute embeddings for.
+        :return: A (number of texts, embedding dimension) float32 array, with the embeddings in the same order as the texts.
+        """
+        # Ensure the texts are not over a certain limit length
+        texts = [limit_token_length(text) for text in texts]
+
+        try:
+            return np.asarray(await self.embeddings_model.aembed_documents(texts), dtype=np.float32)
+
+        except Exception as batch_embedding_excep:
+            logging.error(f"Error while computing batch embeddings: {batch_embedding_excep}")
+            raise EmbeddingComputationError("Failed to compute batch embeddings") from batch_embedding_excep
+
+
+    def compute_concurrent_batch_embeddings(self, texts_batches: List[List[str]]) -> Iterator[np.ndarray]:
+        """
+        Computes the embeddings of several batches of texts concurrently.
+        Consecutive batches are grouped into requests of up to the embeddings request size, so small batches
+        don't each cost an HTTP round trip. The requests are I/O bound, so running them on the shared thread pool
+        overlaps their latency.
+
+        :param texts_batches: The list of batches of texts to compute embeddings for.
+        :return: An iterator over the embeddings of each batch, in the same order as the batches.
+        """
+        # Group the batches, a batch larger than the request size is sent on its own and split by the model
+        requests_batches = []
+
+        for texts_batch in texts_batches:
+            if requests_batches and sum(map(len, requests_batches[-1])) + len(texts_batch) <= self.embeddings_request_size:
+                requests_batches[-1].append(texts_batch)
+
+            else:
+                requests_batches.append([texts_batch])
+
+        requests_embeddings = self.executor.map(
+            self.compute_batch_embeddings,
+            [[text for texts_batch in request_batches for text in texts_batch] for request_batches in requests_batches]
+        )
+
+        # Split the embeddings of every request back into its batches
+        for request_batches, request_embeddings in zip(requests_batches, requests_embeddings):
+            offset = 0
+
+            for texts_batch in request_batches:
+                yield request_embeddings[offset:offset + len(texts_batch)]
+
+                offset += len(texts_batch)
+
+
     def clear_cache(self) -> None:
         """
         Clears the cache of computed embeddings.
         """
         logging.info("Clearing OpenAIEmbeddingsService cache...")
 
-        self.cache.clear()
+        self.cache.clear_local()
@@ -1,7 +1,10 @@
 import logging
+import re
+import httpx
 
 # Package imports
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterator, List, NoReturn
 from openai import OpenAIError, RateLimitError, AuthenticationError
 from fastapi import HTTPException
 from langchain_core.output_parsers import StrOutputParser
@@ -9,7 +12,6 @@ from langchain_core.runnables import RunnableSequence, RunnableLambda
 from langchain.prompts import PromptTemplate
 from langchain_core.messages.ai import AIMessage
 from langchain_openai import ChatOpenAI
-from langchain.schema.runnable import RunnableBranch
 
 # Local files imports
 from core.config import get_settings
@@ -19,6 +21,9 @@ from core.config import get_settings
 This module defines the Responder class and its subclasses, which are used to generate responses to questions.
 
 The OpenAI_Responder class uses the OpenAI API and LangChain to route and respond to questions.
+    Its full chain classifies and answers a question with a single request, refusing the non IT questions itself,
+    while get_routed_response keeps the separate classification request.
+    The questions that are clearly off topic are refused by a keyword pre-filter, without any request.
 """
 
 
@@ -28,6 +33,76 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Retrieve the environment variables as settings
 settings = get_settings()
 
+# The connection limits of the HTTP clients shared by the models of a responder
+OPENAI_CONNECTION_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+# The answer given to the questions that aren't related to IT support / account management
+REFUSAL_MESSAGE = "This is not really what I was trained for, therefore I cannot answer. Try again."
+
+# Keywords of the IT support / account management questions, and of the clearly off topic ones
+IT_KEYWORDS_PATTERN = re.compile(
+    r"\b(password|passcode|log ?in|sign ?in|sign ?up|account|username|e-?mail|2fa|mfa|two-factor|authenticat\w*|"
+    r"verif\w*|profile|settings?|reset|lock(ed)?|unlock|vpn|ssh|wi-?fi|network|browser|software|install\w*|"
+    r"update|device|computer|laptop|phone|secur\w*|privacy|notifications?|data)\b",
+    re.IGNORECASE
+)
+OFF_TOPIC_KEYWORDS_PATTERN = re.compile(
+    r"\b(discounts?|coupons?|recipes?|cook\w*|weather|movies?|songs?|jokes?|sports?|football|restaurants?|"
+    r"vacations?|holidays?|horoscopes?|poems?)\b",
+    re.IGNORECASE
+)
+
+
+def is_clearly_off_topic(prompt: str) -> bool:
+    """
+    Helper method.
+    Pre-filters the questions with keywords, so the clearly off topic ones are refused without asking the model.
+    A question mentioning any IT keyword is never considered off topic, the ambiguous ones are left to the model.
+
+    :param prompt: The question to check.
+    :return: True if the question has an off topic keyword and no IT keyword.
+    """
+    return OFF_TOPIC_KEYWORDS_PATTERN.search(prompt) is not None and IT_KEYWORDS_PATTERN.search(prompt) is None
+
+
+def get_response_content(response) -> str:
+    """
+    Helper method.
+    Returns the content of a chain's response, which must be an AIMessage.
+
+    :param response: The response of the chain.
+    :return: The content of the response.
+    """
+    # Ensure the response is an AIMessage and return its content
+    if isinstance(response, AIMessage):
+        return response.content
+
+    # Handle unexpected response types
+    raise HTTPException(status_code=500, detail="Unexpected response type received.")
+
+
+def raise_openai_error(openai_excep: OpenAIError) -> NoReturn:
+    """
+    Helper method.
+    Logs an error of the OpenAI API and raises it as the matching HTTP exception.
+
+    :param openai_excep: The error raised by the OpenAI API.
+    :return: None, it always raises an HTTPException.
+    """
+    if isinstance(openai_excep, AuthenticationError):
+        logging.error(f"AuthenticationError: {openai_excep}")
+        # 401 - Invalid Authentication
+        raise HTTPException(status_code=401, detail=str(openai_excep)) from openai_excep
+
+    if isinstance(openai_excep, RateLimitError):
+        logging.error(f"RateLimitError: {openai_excep}")
+        # 429 - Rate limit reached for requests
+        raise HTTPException(status_code=429, detail=str(openai_excep)) from openai_excep
+
+    logging.error(f"OpenAIError: {openai_excep}")
+    # 500 - The server had an error while processing your request
+    raise HTTPException(status_code=500, detail=str(openai_excep)) from openai_excep
+
 
 class Responder(ABC):
     """
@@ -53,7 +128,8 @@ class OpenAI_Responder(Responder):
             model_name: str = "gpt-3.5-turbo",
             max_tokens: int = 100,
             n: int = 1,
-            temperature: float = 0.3
+            temperature: float = 0.3,
+            max_concurrency: int = 8
         ) -> None:
         """
         Initializes the OpenAI_Responder class.
@@ -61,6 +137,7 @@ class OpenAI_Responder(Responder):
         :param max_tokens: The maximum number of tokens to generate.
         :param n: The number of responses to generate.
         :param temperature: The temperature to use for sampling.
+        :param max_concurrency: The maximum number of chains run concurrently by aget_responses.
         :return: None
         """
         self.openai_api_key = settings.openai_api_key
@@ -73,12 +150,20 @@ class OpenAI_Responder(Responder):
         self.max_tokens = max_tokens
         self.n = n
         self.temperature = temperature
+        self.max_concurrency = max_concurrency
+
+        # A single pool of connections per client, shared by the models of every chain instead of one pool per model
+        self.http_client = httpx.Client(limits=OPENAI_CONNECTION_LIMITS)
+        self.http_async_client = httpx.AsyncClient(limits=OPENAI_CONNECTION_LIMITS)
+
         self.init_router()
 
 
     def init_router(self) -> None:
         """
         Initializes the router for the OpenAI_Responder class.
+        The full chain does the routing within its own prompt, so a question costs a single request;
+        the router, IT and compliance chains are used by get_routed_response.
         """
         router_prompt = PromptTemplate.from_template(
             """Given the following question, determine if it's related to IT support / account management or not.
@@ -108,7 +193,9 @@ class OpenAI_Responder(Responder):
         router_model = ChatOpenAI(
             model_name=self.model_name,
             temperature=0, 
-            openai_api_key=self.openai_api_key
+            openai_api_key=self.openai_api_key,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client
         )
 
         # Define the router chain with the prompt, model and the output parser
@@ -131,7 +218,9 @@ class OpenAI_Responder(Responder):
             temperature=self.temperature, 
             max_tokens=self.max_tokens, 
             n=self.n, 
-            openai_api_key=self.openai_api_key
+            openai_api_key=self.openai_api_key,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client
         )
 
         # Define the IT question answering chain
@@ -144,21 +233,50 @@ class OpenAI_Responder(Responder):
             Refuse to give any tips or advice. Only provide the answer.
 
             Question: {question}
-            Answer: This is not really what I was trained for, therefore I cannot answer. Try again."""
-        ) | router_model
+            Answer: {refusal}"""
+        ).partial(refusal=REFUSAL_MESSAGE) | router_model
         
-        # Create the runnable branch
-        self.branch = RunnableBranch(
-            (lambda x: "IT" in x["topic"].upper(), self.it_chain),
-            (lambda x: "NON_IT" in x["topic"].upper(), self.compliance_chain),
-            self.compliance_chain
-        )
+        # Define a single prompt which both classifies the question and answers it (or refuses to),
+        # instead of waiting for the classification request before sending the answer one
+        routed_prompt = PromptTemplate.from_template(
+            """You are an expert in IT support and account management.
 
-        # Finally, prepare the full chain, which will deal with the question
-        self.full_chain = {
+            First, determine if the following question is related to IT support / account management or not.
+
+            Examples:
+
+            <question>
+            How do I reset my password?
+            </question>
+            Related: yes
+
+            <question>
+            Can I get a discount if I buy a lot of stuff?
+            </question>
+            Related: no
+
+            If it is related, provide a short but helpful answer.
+
+            If it isn't, refuse to give any tips or advice, and only answer exactly with:
+            {refusal}
+
+            Only respond with the answer, without the classification.
+
+            <question>
+            {question}
+            </question>
+            Answer:"""
+        ).partial(refusal=REFUSAL_MESSAGE)
+
+        # Prepare the routing chain of get_routed_response once, instead of on every call
+        self.full_routing_chain = {
             "topic": self.router_chain,
             "question": lambda x: x["question"]
-        } | self.branch
+        } | RunnableLambda(self.route)
+
+        # Finally, prepare the full chain, which will deal with the question
+        # It ends with the IT model, so it returns (or streams) the answer as an AIMessage, like the separate chains
+        self.full_chain = routed_prompt | it_model
 
 
     def get_response(self, prompt: str) -> str:
@@ -169,32 +287,107 @@ class OpenAI_Responder(Responder):
         :param prompt: The prompt to generate a response for.
         :return: The generated response.
         """
+        # Refuse the clearly off topic questions without any request
+        if is_clearly_off_topic(prompt):
+            return REFUSAL_MESSAGE
+
         try:
             response = self.full_chain.invoke({
                 "question": prompt
             })
 
-            # Ensure the response is an AIMessage and return its content
-            if isinstance(response, AIMessage):
-                return response.content
-            else:
-                # Handle unexpected response types
-                raise HTTPException(status_code=500, detail="Unexpected response type received.")
-        
-        except AuthenticationError as authentication_excep:
-            logging.error(f"AuthenticationError: {authentication_excep}")
-            # 401 - Invalid Authentication
-            raise HTTPException(status_code=401, detail=str(authentication_excep)) from authentication_excep
-        
-        except RateLimitError as rate_limit_excep:
-            logging.error(f"RateLimitError: {rate_limit_excep}")
-            # 429 - Rate limit reached for requests
-            raise HTTPException(status_code=429, detail=str(rate_limit_excep)) from rate_limit_excep
-        
         except OpenAIError as openai_excep:
-            logging.error(f"OpenAIError: {openai_excep}")
-            # 500 - The server had an error while processing your request
-            raise HTTPException(status_code=500, detail=str(openai_excep)) from openai_excep
+            raise_openai_error(openai_excep)
+
+        return get_response_content(response)
+
+
+    async def aget_response(self, prompt: str) -> str:
+        """
+        Asynchronously generates a response to a prompt using the OpenAI API.
+        The chain is awaited through the models' async clients, so the event loop isn't blocked by the requests.
+
+        :param prompt: The prompt to generate a response for.
+        :return: The generated response.
+        """
+        # Refuse the clearly off topic questions without any request
+        if is_clearly_off_topic(prompt):
+            return REFUSAL_MESSAGE
+
+        try:
+            response = await self.full_chain.ainvoke({
+                "question": prompt
+            })
+
+        except OpenAIError as openai_excep:
+            raise_openai_error(openai_excep)
+
+        return get_response_content(response)
+
+
+    async def aget_responses(self, prompts: List[str]) -> List[str]:
+        """
+        Asynchronously generates the responses to several prompts using the OpenAI API (e.g. for a bulk evaluation).
+        The chains of the prompts run concurrently, so their requests overlap instead of being sent one after the other,
+        while at most max_concurrency of them run at once, to stay within the API's rate limits.
+
+        :param prompts: The prompts to generate responses for.
+        :return: The generated responses, in the same order as the prompts.
+        """
+        # Only the questions that aren't clearly off topic are sent, the others are refused without any request
+        off_topic_prompts = [is_clearly_off_topic(prompt) for prompt in prompts]
+
+        try:
+            responses = await self.full_chain.abatch(
+                [{"question": prompt} for prompt, off_topic in zip(prompts, off_topic_prompts) if not off_topic],
+                config={"max_concurrency": self.max_concurrency}
+            )
+
+        except OpenAIError as openai_excep:
+            raise_openai_error(openai_excep)
+
+        # Return the responses' contents, in the order of the prompts
+        responses_contents = iter([get_response_content(response) for response in responses])
+
+        return [REFUSAL_MESSAGE if off_topic else next(responses_contents) for off_topic in off_topic_prompts]
+
+
+    def stream_response(self, prompt: str) -> Iterator[str]:
+        """
+        Generates a response to a prompt using the OpenAI API, yielding its text as it is generated.
+        The errors are raised as they are, since the caller may already have sent the first parts of the response.
+
+        :param prompt: The prompt to generate a response for.
+        :return: An iterator over the parts of the generated response.
+        """
+        # Refuse the clearly off topic questions without any request
+        if is_clearly_off_topic(prompt):
+            yield REFUSAL_MESSAGE
+            return
+
+        for chunk in self.full_chain.stream({"question": prompt}):
+            # The chosen branch yields message chunks, whose content is the newly generated text
+            if chunk.content:
+                yield chunk.content
+
+
+    async def astream_response(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Asynchronously generates a response to a prompt using the OpenAI API, yielding its text as it is generated.
+        The errors are raised as they are, since the caller may already have sent the first parts of the response.
+
+        :param prompt: The prompt to generate a response for.
+        :return: An async iterator over the parts of the generated response.
+        """
+        # Refuse the clearly off topic questions without any request
+        if is_clearly_off_topic(prompt):
+            yield REFUSAL_MESSAGE
+            return
+
+        async for chunk in self.full_chain.astream({"question": prompt}):
+            # The chosen branch yields message chunks, whose content is the newly generated text
+            if chunk.content:
+                yield chunk.content
 
 
     def route(self, info) -> RunnableSequence:
@@ -227,34 +420,16 @@ class OpenAI_Responder(Responder):
         :param prompt: The prompt to generate a response for.
         :return: The generated response.
         """
-        full_routing_chain = {
-            "topic": self.router_chain,
-            "question": lambda x: x["question"]
-        } | RunnableLambda(self.route)
+        # Refuse the clearly off topic questions without any request
+        if is_clearly_off_topic(prompt):
+            return REFUSAL_MESSAGE
 
         try:
-            response = full_routing_chain.invoke({
+            response = self.full_routing_chain.invoke({
                 "question": prompt
             })
 
-            # Ensure the response is an AIMessage and return its content
-            if isinstance(response, AIMessage):
-                return response.content
-            else:
-                # Handle unexpected response types
-                raise HTTPException(status_code=500, detail="Unexpected response type received.")
-        
-        except AuthenticationError as authentication_excep:
-            logging.error(f"AuthenticationError: {authentication_excep}")
-            # 401 - Invalid Authentication
-            raise HTTPException(status_code=401, detail=str(authentication_excep)) from authentication_excep
-        
-        except RateLimitError as rate_limit_excep:
-            logging.error(f"RateLimitError: {rate_limit_excep}")
-            # 429 - Rate limit reached for requests
-            raise HTTPException(status_code=429, detail=str(rate_limit_excep)) from rate_limit_excep
-        
         except OpenAIError as openai_excep:
-            logging.error(f"OpenAIError: {openai_excep}")
-            # 500 - The server had an error while processing your request
-            raise HTTPException(status_code=500, detail=str(openai_excep)) from openai_excep
+            raise_openai_error(openai_excep)
+
+        return get_response_content(response)
@@ -0,0 +1,84 @@
+import logging
+
+# Package imports
+from typing import Any, List, Optional
+from celery import Task
+from starlette.concurrency import run_in_threadpool
+
+# Local files imports
+from core.config import get_settings
+from database.manage_database import add_embeddings_to_db
+from services.batching_queue_service import BatchingQueue
+
+
+"""
+This module implements the BatchedTaskQueue class, which gathers the items sent to a Celery task by the routes
+    and sends them in batches, instead of publishing a task per request.
+
+add_embeddings_queue batches the items of the add_embeddings_to_db task.
+It is started and stopped by the application's lifespan.
+"""
+
+
+# Set the logging config
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Retrieve the environment variables as settings
+settings = get_settings()
+
+
+class BatchedTaskQueue(BatchingQueue):
+    """
+    Queue of the items of a Celery task, flushed as a single task once it holds enough items or its oldest item waited long enough.
+    """
+    def __init__(self, task: Task, max_batch_size: Optional[int] = None, flush_interval: Optional[float] = None) -> None:
+        """
+        Initializes the queue. The asyncio queue and its worker are only created by start, within the running event loop.
+
+        :param task: The Celery task receiving the batches of items.
+        :param max_batch_size: The maximum number of items sent in one task, defaults to the write queue batch size setting.
+        :param flush_interval: The maximum number of seconds an item waits, defaults to the write queue flush interval setting.
+        :return: None
+        """
+        super().__init__(
+            max_batch_size=max_batch_size if max_batch_size is not None else int(settings.write_queue_batch_size),
+            batch_window=flush_interval if flush_interval is not None else int(settings.write_queue_flush_interval_ms) / 1000
+        )
+
+        self.task = task
+
+
+    async def put(self, item: Any) -> None:
+        """
+        Adds an item to the queue, or sends it right away if the queue isn't running.
+
+        :param item: The item to send to the task.
+        :return: None
+        """
+        if self.worker is None:
+            await self.handle_batch([item])
+            return
+
+        await self.queue.put(item)
+
+
+    async def handle_batch(self, batch: List[Any]) -> None:
+        """
+        Sends a batch of items as a single task. Publishing to the broker is blocking, so it runs in the threadpool.
+
+        :param batch: The items to send.
+        :return: None
+        """
+        # Identical items are only sent once
+        batch = list(dict.fromkeys(batch))
+
+        try:
+            await run_in_threadpool(self.task.delay, batch)
+            logging.info(f"Sent {len(batch)} item(s) to the '{self.task.name}' task.")
+
+        except Exception as send_excep:
+            logging.error(f"Could not send {len(batch)} item(s) to the '{self.task.name}' task: {send_excep}")
+
+
+# The queue batching the embeddings additions of the routes
+add_embeddings_queue = BatchedTaskQueue(add_embeddings_to_db)
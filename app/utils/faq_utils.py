@@ -1,8 +1,9 @@
 import logging
-import json
 import os
+import orjson
 
 # Package imports
+from functools import lru_cache
 from typing import Optional
 
 # Local files imports
@@ -12,6 +13,8 @@ from core.config import get_settings
 """
 This module defines methods for retrieving locally stored FAQ data and managing the collection name
     for the FAQs in the environment variables.
+
+The FAQ entries are cached per version of the FAQ file, so it is only read and parsed again once it has been modified.
 """
 
 
@@ -31,22 +34,38 @@ def get_faq_collection_name() -> str:
     return settings.faq_collection_name
 
 
+@lru_cache(maxsize=1)
+def retrieve_FAQ_version(faq_json_file: str, modified_time: float) -> tuple:
+    """
+    Loads the FAQ entries of a FAQ file, caching them per file version.
+
+    :param faq_json_file: The path to the JSON file containing the FAQ database.
+    :param modified_time: The modification time of the FAQ file, which keys the cached version.
+    :return: A tuple of dictionaries containing the FAQ data.
+    """
+    faq_local_database_loader = FAQ_Loader(faq_json_file=faq_json_file, limit=100)
+
+    return tuple(faq_local_database_loader.load_faq_database())
+
+
 def retrieve_locally_stored_FAQ() -> list:
     """
-    Retrieves the locally stored FAQ database.
+    Retrieves the locally stored FAQ database, only reading the file again when it has been modified since.
 
     :return: A list of dictionaries containing the FAQ data or an empty list if an error occurs.
     """
-    faq_local_database = []
-
     logging.info("Retrieving locally stored FAQ database...")
 
     faq_json_file = os.path.join(os.path.dirname(__file__), 'FAQ_database.json')
-    
-    faq_local_database_loader = FAQ_Loader(faq_json_file=faq_json_file, limit=100)
-    faq_local_database = faq_local_database_loader.load_faq_database()
-    
-    return faq_local_database
+
+    try:
+        modified_time = os.path.getmtime(faq_json_file)
+
+    except FileNotFoundError as file_not_found_excep:
+        logging.error(f"FAQ file not found: {faq_json_file}")
+        raise file_not_found_excep
+
+    return list(retrieve_FAQ_version(faq_json_file, modified_time))
 
 
 class FAQ_Loader:
@@ -68,12 +87,13 @@ class FAQ_Loader:
     def load_faq_database(self) -> list:
         """
         Loads the FAQ database from the JSON file up until the specified limit.
+        The file is read as bytes and parsed with orjson.
 
         :return: A list of dictionaries representing the FAQ entries.
         """
         try:
-            with open(self.faq_json_file, "r") as faq_data:
-                faqs = json.load(faq_data)
+            with open(self.faq_json_file, "rb") as faq_data:
+                faqs = orjson.loads(faq_data.read())
 
             if self.limit is not None:
                 logging.info(f"Loading up to {self.limit} FAQ entries...")
@@ -89,6 +109,6 @@ class FAQ_Loader:
             logging.error(f"FAQ file not found: {self.faq_json_file}")
             raise file_not_found_excep
 
-        except json.JSONDecodeError as json_decode_excep:
+        except orjson.JSONDecodeError as json_decode_excep:
             logging.error(f"Error decoding JSON from file: {self.faq_json_file}")
             raise json_decode_excep
@@ -1,14 +1,14 @@
 import logging
-import numpy as np
 
 # Package imports
-from langchain_community.utils.math import cosine_similarity
-from typing import Generator, List, Tuple
+from functools import lru_cache
+from typing import AsyncGenerator, Generator, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 # Local files imports
 from core.config import get_settings
-from database.base import get_db_session
+from database.base import get_async_db_session, get_db_session
 from database.manage_database import add_embeddings_to_db
 from .faq_utils import retrieve_locally_stored_FAQ, get_faq_collection_name
 from services.llm_service import OpenAI_Responder
@@ -19,8 +19,7 @@ This module contains utility functions used throughout the application.
 
 get_openai_responder: Returns an instance of the OpenAI_Responder class with parameters from environment variables.
 get_database_session: Provides a database session for FastAPI dependency injection.
-search_for_similarity: Finds the most similar embedding to the query embedding in the list of embeddings.
-    Computes the cosine similarity between the query embedding and each embedding in the list.
+get_async_database_session: Provides an asyncio database session for FastAPI dependency injection.
 store_initial_embeddings: Stores the initial embeddings of the FAQ database in the database.
 """
 
@@ -32,9 +31,11 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 settings = get_settings()
 
 
+@lru_cache
 def get_openai_responder() -> OpenAI_Responder:
     """
     Initializes and returns an instance of the OpenAI_Responder class with parameters from environment variables.
+    It's cached, so every request shares the same chains and the pooled HTTP clients of their models.
     
     :return: An instance of the OpenAI_Responder class.
     """
@@ -44,6 +45,7 @@ def get_openai_responder() -> OpenAI_Responder:
     max_tokens = int(settings.openai_model_max_tokens)
     n = int(settings.openai_model_n)
     temperature = float(settings.openai_model_temperature)
+    max_concurrency = int(settings.openai_max_concurrency)
 
     if any(param is None for param in [model_name, max_tokens, n, temperature]):
         logging.error("One or more required parameters are missing in the environment variables.")
@@ -53,7 +55,8 @@ def get_openai_responder() -> OpenAI_Responder:
         model_name=model_name, 
         max_tokens=max_tokens, 
         n=n, 
-        temperature=temperature
+        temperature=temperature,
+        max_concurrency=max_concurrency
     )
 
 
@@ -69,42 +72,27 @@ def get_database_session() -> Generator[Session, None, None]:
         yield db_session
 
 
-def search_for_similarity(query_embedding: np.ndarray, embeddings: List[np.ndarray]) -> Tuple[int, float]:
+async def get_async_database_session() -> AsyncGenerator[AsyncSession, None]:
     """
-    Finds the most similar embedding to the query embedding in the list of embeddings.
-    Computes the cosine similarity between the query embedding and each embedding in the list.
+    Provides an asyncio database session for FastAPI dependency injection.
+    Uses the already defined get_async_db_session context manager.
 
-    :param query_embedding: The embedding to search for.
-    :param embeddings: The list of embeddings to search in.
-    :return: The index of the most similar embedding and its similarity score.
+    :return: An asyncio database session
     """
-    if not embeddings:
-        logging.warning("No embeddings provided for similarity search!")
-        return -1, 0.0
-    
-    # Normalize the embedding of the prompt
-    query_embedding = query_embedding / np.linalg.norm(query_embedding)
-
-    # Normalize all the other embeddings
-    normalized_embeddings = [embedding / np.linalg.norm(embedding) for embedding in embeddings]
-
-    # Compute the cosine similarity
-    similarities = cosine_similarity([query_embedding], normalized_embeddings)[0]
-
-    most_similar_index = np.argmax(similarities)
-    similarity_score = similarities[most_similar_index]
-
-    return most_similar_index, similarity_score
+    async with get_async_db_session() as db_session:
+        yield db_session
 
 
-def store_initial_embeddings() -> None:
+def store_initial_embeddings(faq_local_database: Optional[list] = None) -> None:
     """
     Stores the initial embeddings of the FAQ database in the database.
     Uses the OpenAIEmbeddingsService to compute the embeddings.
 
+    :param faq_local_database: Optional, the already loaded FAQ entries, otherwise they are read from the local file.
     :return: None
     """
-    faq_local_database = retrieve_locally_stored_FAQ()
+    if faq_local_database is None:
+        faq_local_database = retrieve_locally_stored_FAQ()
 
     if len(faq_local_database) == 0:
         logging.error("No FAQ database found!")